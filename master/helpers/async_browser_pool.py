@@ -0,0 +1,92 @@
+import asyncio
+import contextlib
+
+from playwright.async_api import Playwright, Browser, BrowserContext, Error
+
+from helpers.browser_pool import launch_options
+from helpers.helper_functions import log_note, track_requests, FAST_MODE
+from helpers import network_stats
+
+
+async def launch_browser(playwright: Playwright, browser_name: str, **kwargs) -> Browser:
+    browser_type = playwright.firefox if browser_name == "firefox" else playwright.chromium
+    return await browser_type.launch(**launch_options(browser_name, **kwargs))
+
+
+class AsyncBrowserPool:
+    """async_playwright counterpart of helpers.browser_pool.BrowserPool.
+
+    Unlike the sync pool it does not instrument contexts for browser metrics, their phase end listener cannot await pages.
+    """
+
+    def __init__(self, playwright: Playwright, browser_name: str, contexts_per_browser=None, **launch_kwargs):
+        self.playwright = playwright
+        self.browser_name = browser_name
+        self.contexts_per_browser = contexts_per_browser
+        self.launch_kwargs = launch_kwargs
+        self.browsers = {} # browser -> list of its open contexts
+        self.lock = asyncio.Lock()
+
+    async def launch(self) -> Browser:
+        log_note(f"Launch browser {self.browser_name}")
+        browser = await launch_browser(self.playwright, self.browser_name, **self.launch_kwargs)
+        self.browsers[browser] = []
+        return browser
+
+    async def get_browser(self) -> Browser:
+        for browser, contexts in list(self.browsers.items()):
+            if not browser.is_connected():
+                del self.browsers[browser]
+                continue
+            if self.contexts_per_browser is None or len(contexts) < self.contexts_per_browser:
+                return browser
+        return await self.launch()
+
+    async def new_context(self, **context_kwargs) -> BrowserContext:
+        context_kwargs.setdefault('ignore_https_errors', True)
+        async with self.lock:
+            browser = await self.get_browser()
+            # Reserve the slot while holding the lock so concurrent callers don't overfill a browser
+            slot = object()
+            self.browsers[browser].append(slot)
+        try:
+            context = await browser.new_context(**context_kwargs)
+        finally:
+            # close() may have dropped the browser meanwhile
+            contexts = self.browsers.get(browser, [])
+            if slot in contexts:
+                contexts.remove(slot)
+        self.browsers.setdefault(browser, []).append(context)
+        if FAST_MODE:
+            track_requests(context)
+        if network_stats.NETWORK_STATS:
+            # request.sizes() is a coroutine here and handlers can't await it, so bytes come from content-length
+            network_stats.instrument(context, exact_sizes=False)
+        return context
+
+    async def release(self, context: BrowserContext) -> None:
+        for contexts in self.browsers.values():
+            if context in contexts:
+                contexts.remove(context)
+        with contextlib.suppress(Error):
+            await context.close()
+
+    async def close(self) -> None:
+        for browser, contexts in list(self.browsers.items()):
+            # Skip the slots of contexts that are still being created
+            for context in [context for context in contexts if isinstance(context, BrowserContext)]:
+                await self.release(context)
+            with contextlib.suppress(Error):
+                await browser.close()
+        self.browsers = {}
+
+
+async def open_concurrently(pool: AsyncBrowserPool, openers) -> list:
+    # Runs coroutines that each return (context, page) at once. If one fails, the contexts the others opened are
+    # released before its exception is raised, instead of staying open until the browser closes.
+    results = await asyncio.gather(*openers, return_exceptions=True)
+    failed = [result for result in results if isinstance(result, BaseException)]
+    if failed:
+        await asyncio.gather(*[pool.release(context) for context, _ in (result for result in results if not isinstance(result, BaseException))])
+        raise failed[0]
+    return results
@@ -0,0 +1,103 @@
+import contextlib
+import os
+import weakref
+
+from playwright.sync_api import BrowserContext
+
+from helpers.event_log import events
+
+# Set NC_BROWSER_METRICS=1 to attach the browser's own timings to every phase in the event log
+BROWSER_METRICS = os.environ.get('NC_BROWSER_METRICS', '0') == '1'
+SLOWEST_REQUESTS = 20
+
+# Runs in every document before the app's scripts. Entry types the browser does not support are skipped.
+INIT_SCRIPT = """
+(() => {
+    const perf = window.__ncPerf = {longTasks: [], lcp: null, maxEventDuration: 0, reported: false};
+    performance.setResourceTimingBufferSize(10000);
+    const observe = (type, callback, options = {}) => {
+        try {
+            new PerformanceObserver((list) => list.getEntries().forEach(callback)).observe({type, buffered: true, ...options});
+        } catch (e) {}
+    };
+    observe('longtask', (entry) => perf.longTasks.push(entry.duration));
+    observe('largest-contentful-paint', (entry) => { perf.lcp = entry.startTime; });
+    // Longest interaction is what INP reports for pages with few interactions
+    observe('event', (entry) => { if (entry.interactionId) perf.maxEventDuration = Math.max(perf.maxEventDuration, entry.duration); }, {durationThreshold: 16});
+})();
+"""
+
+# Returns everything since the last call and resets it, so each phase only sees its own entries
+COLLECT_SCRIPT = """
+(slowest) => {
+    const perf = window.__ncPerf || {longTasks: [], lcp: null, maxEventDuration: 0, reported: true};
+    const round = (value) => Math.round(value * 10) / 10;
+    const result = {url: location.href};
+
+    const navigation = performance.getEntriesByType('navigation')[0];
+    if (navigation && !perf.reported) {
+        result.navigation = {
+            ttfb: round(navigation.responseStart - navigation.requestStart),
+            response: round(navigation.responseEnd - navigation.responseStart),
+            dom_interactive: round(navigation.domInteractive),
+            dom_content_loaded: round(navigation.domContentLoadedEventEnd),
+            load: round(navigation.loadEventEnd),
+            transfer_size: navigation.transferSize,
+        };
+        perf.reported = true;
+    }
+
+    const resources = performance.getEntriesByType('resource');
+    performance.clearResourceTimings();
+    const api = resources.filter((entry) => ['xmlhttprequest', 'fetch'].includes(entry.initiatorType));
+    result.resources = {
+        count: resources.length,
+        transfer_size: resources.reduce((sum, entry) => sum + (entry.transferSize || 0), 0),
+        api_count: api.length,
+        api_time: round(api.reduce((sum, entry) => sum + entry.duration, 0)),
+        api_ttfb: round(api.reduce((sum, entry) => sum + Math.max(entry.responseStart - entry.requestStart, 0), 0)),
+        slowest: resources.sort((a, b) => b.duration - a.duration).slice(0, slowest).map((entry) => ({
+            name: entry.name.split('?')[0],
+            type: entry.initiatorType,
+            duration: round(entry.duration),
+            ttfb: round(Math.max(entry.responseStart - entry.requestStart, 0)),
+            transfer_size: entry.transferSize,
+        })),
+    };
+
+    result.long_tasks = {count: perf.longTasks.length, total: round(perf.longTasks.reduce((a, b) => a + b, 0)), max: round(Math.max(0, ...perf.longTasks))};
+    result.lcp = perf.lcp === null ? null : round(perf.lcp);
+    result.inp = round(perf.maxEventDuration);
+    perf.longTasks = [];
+    perf.maxEventDuration = 0;
+    return result;
+}
+"""
+
+_contexts = weakref.WeakSet()
+
+
+def instrument(context: BrowserContext) -> None:
+    context.add_init_script(INIT_SCRIPT)
+    _contexts.add(context)
+
+
+def collect(page) -> dict:
+    # The page may navigate or close while collecting, or the driver may already be gone at exit
+    with contextlib.suppress(Exception):
+        return page.evaluate(COLLECT_SCRIPT, SLOWEST_REQUESTS)
+    return None
+
+
+def attach_metrics(phase: dict) -> None:
+    metrics = []
+    for context in list(_contexts):
+        for page in context.pages:
+            if not page.is_closed() and (page_metrics := collect(page)) is not None:
+                metrics.append(page_metrics)
+    if metrics:
+        phase['browser'] = metrics
+
+
+if BROWSER_METRICS:
+    events.add_listener(attach_metrics)
@@ -0,0 +1,155 @@
+import contextlib
+import os
+import sys
+
+from playwright.sync_api import Playwright, Browser, BrowserContext, Error
+
+from helpers.browser_metrics import instrument, BROWSER_METRICS
+from helpers.helper_functions import log_note, track_requests, FAST_MODE
+from helpers import network_stats
+
+# Browsers run headless unless HEADLESS=0 is set or a script is started with --headed.
+# Headed mode is meant for debugging through the DISPLAY mounted in compose.yml.
+HEADLESS = os.environ.get('HEADLESS', '1') != '0'
+
+CHROMIUM_ARGS = ['--disable-gpu', '--disable-software-rasterizer']
+CHROMIUM_HEADED_ARGS = ['--ozone-platform=wayland']
+
+FAKE_MEDIA_FIREFOX_PREFS = {
+    "media.navigator.streams.fake": True,
+    "media.navigator.permission.disabled": True
+}
+FAKE_MEDIA_CHROMIUM_ARGS = ['--use-fake-ui-for-media-stream', '--use-fake-device-for-media-stream']
+
+
+def set_headless(headless: bool) -> None:
+    global HEADLESS
+    HEADLESS = headless
+
+
+def parse_headless_flag() -> None:
+    # Removes --headed / --headless from sys.argv so the scripts' positional arguments stay the same
+    for flag, headless in (('--headed', False), ('--headless', True)):
+        if flag in sys.argv:
+            sys.argv.remove(flag)
+            set_headless(headless)
+
+
+def launch_options(browser_name: str, headless=None, window_size=None, fake_media=False, downloads_path=None) -> dict:
+    if headless is None:
+        headless = HEADLESS
+    options = {'headless': headless}
+
+    if browser_name == "firefox":
+        args = []
+        if window_size:
+            args += ['-width', str(window_size[0]), '-height', str(window_size[1])]
+        if fake_media:
+            options['firefox_user_prefs'] = dict(FAKE_MEDIA_FIREFOX_PREFS)
+    else:
+        args = list(CHROMIUM_ARGS)
+        if not headless:
+            args += CHROMIUM_HEADED_ARGS
+        if window_size:
+            args.append(f'--window-size={window_size[0]},{window_size[1]}')
+        if fake_media:
+            args += FAKE_MEDIA_CHROMIUM_ARGS
+
+    if args:
+        options['args'] = args
+    if downloads_path:
+        options['downloads_path'] = downloads_path
+
+    return options
+
+
+def launch_browser(playwright: Playwright, browser_name: str, **kwargs) -> Browser:
+    browser_type = playwright.firefox if browser_name == "firefox" else playwright.chromium
+    return browser_type.launch(**launch_options(browser_name, **kwargs))
+
+
+class BrowserPool:
+    """Keeps browsers running and hands out fresh, isolated contexts from them.
+
+    With contexts_per_browser set, a new browser is launched once all running ones hold that many contexts.
+    """
+
+    def __init__(self, playwright: Playwright, browser_name: str, contexts_per_browser=None, **launch_kwargs):
+        self.playwright = playwright
+        self.browser_name = browser_name
+        self.contexts_per_browser = contexts_per_browser
+        self.launch_kwargs = launch_kwargs
+        self.browsers = {} # browser -> list of its open contexts
+
+    def launch(self) -> Browser:
+        log_note(f"Launch browser {self.browser_name}")
+        browser = launch_browser(self.playwright, self.browser_name, **self.launch_kwargs)
+        self.browsers[browser] = []
+        return browser
+
+    def get_browser(self) -> Browser:
+        for browser, contexts in list(self.browsers.items()):
+            if not browser.is_connected():
+                del self.browsers[browser]
+                continue
+            if self.contexts_per_browser is None or len(contexts) < self.contexts_per_browser:
+                return browser
+        return self.launch()
+
+    def warm(self, browsers=1) -> None:
+        # Launches what a scenario will need up front, so its measured steps don't pay for cold starts
+        while len(self.browsers) < browsers:
+            self.launch()
+
+    def new_context(self, **context_kwargs) -> BrowserContext:
+        context_kwargs.setdefault('ignore_https_errors', True)
+        browser = self.get_browser()
+        context = browser.new_context(**context_kwargs)
+        self.browsers[browser].append(context)
+        if FAST_MODE:
+            track_requests(context)
+        if BROWSER_METRICS:
+            instrument(context)
+        if network_stats.NETWORK_STATS:
+            network_stats.instrument(context)
+        return context
+
+    def release(self, context: BrowserContext) -> None:
+        # Only the context is thrown away, the browser stays warm for the next one
+        for contexts in self.browsers.values():
+            if context in contexts:
+                contexts.remove(context)
+        with contextlib.suppress(Error):
+            context.close()
+
+    @contextlib.contextmanager
+    def context(self, **context_kwargs):
+        context = self.new_context(**context_kwargs)
+        try:
+            yield context
+        finally:
+            self.release(context)
+
+    def close(self) -> None:
+        for browser, contexts in self.browsers.items():
+            for context in list(contexts):
+                self.release(context)
+            with contextlib.suppress(Error):
+                browser.close()
+        self.browsers = {}
+
+
+_pools = {}
+
+def get_pool(playwright: Playwright, browser_name: str, contexts_per_browser=None, **launch_kwargs) -> BrowserPool:
+    # One pool per driver, browser and launch configuration so scenarios with the same needs share a browser
+    key = (id(playwright), browser_name, contexts_per_browser, tuple(sorted(launch_kwargs.items())))
+    if key not in _pools:
+        _pools[key] = BrowserPool(playwright, browser_name, contexts_per_browser, **launch_kwargs)
+    return _pools[key]
+
+
+def close_pools() -> None:
+    for pool in _pools.values():
+        pool.close()
+    _pools.clear()
@@ -0,0 +1,93 @@
+import asyncio
+import contextlib
+import random
+import string
+from time import perf_counter_ns
+
+from playwright.async_api import Error
+
+from helpers.async_browser_pool import AsyncBrowserPool
+from helpers.event_log import get_labels, set_labels
+from helpers.helper_functions import log_note
+from helpers import latency
+
+
+def parse_schedule(schedule: str) -> list:
+    """Parses "10@60,20@60,0@0" into [(10, 60.0), (20, 60.0), (0, 0.0)], i.e. participant count and seconds to hold it."""
+    steps = []
+    for step in schedule.split(','):
+        count, _, hold = step.strip().partition('@')
+        steps.append((int(count), float(hold or 0)))
+    return steps
+
+
+class CallParticipants:
+    """Guests of a Talk call, each in its own context of a shared browser, that can be ramped in and out."""
+
+    def __init__(self, pool: AsyncBrowserPool, url: str, ramp_interval_sec=0):
+        self.pool = pool
+        self.url = url
+        self.ramp_interval_sec = ramp_interval_sec
+        self.participants = [] # (guest name, context, page)
+
+    async def join(self) -> None:
+        guest_name = "Guest " + ''.join(random.choices(string.ascii_letters, k=5))
+        # _ramp runs every join and leave as a task of its own, which has its own copy of the labels
+        set_labels(user=guest_name)
+        started = perf_counter_ns()
+        context = await self.pool.new_context(viewport={'width': 1280, 'height': 720})
+        try:
+            page = await context.new_page()
+            await page.goto(self.url)
+            await page.get_by_placeholder('Guest').fill(guest_name)
+            await page.get_by_role('button', name="Submit name and join").click()
+            await page.locator('.message-main').get_by_role("button", name="Join call").click()
+            await page.locator('.media-settings__call-buttons').get_by_role("button", name="Join call").click()
+        except BaseException:
+            await self.pool.release(context)
+            raise
+        self.participants.append((guest_name, context, page))
+        # Guests join concurrently within the ramp phase, so each join is timed on its own and the notes must not end it
+        latency.record(get_labels().get('scenario', latency.SCRIPT_NAME), 'Guest joins the call', (perf_counter_ns() - started) // 1000)
+        log_note(f"{guest_name} joined the chat", kind='result')
+
+    async def leave(self) -> None:
+        guest_name, context, page = self.participants.pop()
+        set_labels(user=guest_name)
+        with contextlib.suppress(Error):
+            await page.get_by_role("button", name="Leave call").click()
+        await self.pool.release(context)
+        log_note(f"{guest_name} left the chat", kind='result')
+
+    async def _ramp(self, action, count: int) -> None:
+        # Like open_concurrently, every join or leave settles before the first failure is raised,
+        # so leave_all afterwards sees all participants that made it into the call
+        tasks = []
+        try:
+            for _ in range(count):
+                tasks.append(asyncio.create_task(action()))
+                if self.ramp_interval_sec:
+                    await asyncio.sleep(self.ramp_interval_sec)
+        finally:
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            raise errors[0]
+
+    async def ramp_to(self, count: int) -> None:
+        difference = count - len(self.participants)
+        if difference > 0:
+            log_note(f"Ramping up to {count} call participants")
+            await self._ramp(self.join, difference)
+        elif difference < 0:
+            log_note(f"Ramping down to {count} call participants")
+            await self._ramp(self.leave, -difference)
+
+    async def run_schedule(self, schedule: list) -> None:
+        for count, hold_sec in schedule:
+            await self.ramp_to(count)
+            log_note(f"Staying in the call with {len(self.participants)} participants for {hold_sec}s")
+            await asyncio.sleep(hold_sec)
+
+    async def leave_all(self) -> None:
+        await self.ramp_to(0)
@@ -0,0 +1,55 @@
+import os
+import random
+import string
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from helpers.dav_client import DavClient
+from helpers.payload import Payload, payload_file
+
+# Chunked upload v2 as the web UI does it: MKCOL an upload collection, PUT numbered chunks, MOVE .file to the target.
+# Nextcloud wants chunk numbers from 1 to 10000 and, on object storage, chunks of at least 5 MiB except the last one.
+MAX_CHUNKS = 10000
+
+
+def chunked_upload(client: DavClient, path: str, payload: Payload, chunk_size: int, parallel=1) -> dict:
+    chunk_count = max((payload.size + chunk_size - 1) // chunk_size, 1)
+    if chunk_count > MAX_CHUNKS:
+        raise ValueError(f"{payload.size} bytes in chunks of {chunk_size} are {chunk_count} chunks, Nextcloud allows {MAX_CHUNKS}")
+
+    upload_path = client.dav_path('uploads', 'upload-' + ''.join(random.choices(string.ascii_letters + string.digits, k=16)))
+    # Both headers let the server check quota and pick the storage for the target up front
+    headers = {'Destination': client.base_url + client.files_path(path), 'OC-Total-Length': str(payload.size)}
+
+    # Generating the content would be counted as upload time, reading the cached file back is a page cache copy
+    source_path = payload_file(payload.size, seed=payload.seed, compressibility=payload.compressibility, text=payload.text)
+
+    with open(source_path, 'rb') as source:
+        def put_chunk(number: int) -> None:
+            data = os.pread(source.fileno(), chunk_size, (number - 1) * chunk_size)
+            client.request('PUT', f"{upload_path}/{number}", data, {**headers, 'Content-Length': str(len(data))}, expect=(201, 204), name='Chunk PUT')
+
+        started = perf_counter()
+        client.mkcol(upload_path, headers=headers, name='Chunk MKCOL')
+        try:
+            with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix='chunk-upload') as executor:
+                # list() to raise the first failed chunk
+                list(executor.map(put_chunk, range(1, chunk_count + 1)))
+
+            assembly_started = perf_counter()
+            client.move(f"{upload_path}/.file", client.files_path(path), headers={'OC-Total-Length': str(payload.size)}, name='Chunk assembly MOVE')
+            finished = perf_counter()
+        except BaseException:
+            # Nextcloud cleans abandoned uploads up only after days
+            client.request('DELETE', upload_path, expect=None, name='Chunk cleanup DELETE')
+            raise
+
+    return {
+        'size': payload.size,
+        'chunk_size': chunk_size,
+        'chunks': chunk_count,
+        'parallel': parallel,
+        'seconds': round(finished - started, 3),
+        'assembly_seconds': round(finished - assembly_started, 3),
+        'mb_per_sec': round(payload.size / 1024 / 1024 / (finished - started), 2),
+    }
@@ -0,0 +1,246 @@
+import base64
+import http.client
+import json
+import os
+import queue
+import ssl
+import threading
+import urllib.parse
+import xml.etree.ElementTree as ET
+from time import perf_counter_ns
+
+from helpers.event_log import events, get_labels
+from helpers import latency
+
+# Browserless client for WebDAV and the OCS API. Only uses the standard library, so drivers built on it cost
+# next to nothing on the client compared to a browser.
+DAV_TIMEOUT_SEC = float(os.environ.get('NC_DAV_TIMEOUT', 60))
+READ_SIZE = 256 * 1024
+
+NAMESPACES = {
+    'd': 'DAV:', 'oc': 'http://owncloud.org/ns', 'nc': 'http://nextcloud.org/ns',
+    'cal': 'urn:ietf:params:xml:ns:caldav', 'card': 'urn:ietf:params:xml:ns:carddav',
+}
+# Retrying is only safe if the request never reached the server, which is what these mean on a reused connection
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError, BrokenPipeError)
+
+
+def parse_users(users: str, default_password='nextcloud') -> list:
+    # "alice,bob:secret" -> [('alice', default_password), ('bob', 'secret')]
+    return [tuple(user.split(':', 1)) if ':' in user else (user, default_password) for user in (user.strip() for user in users.split(',')) if user]
+
+
+SYNC_COLLECTION = (
+    '<?xml version="1.0" encoding="utf-8"?><d:sync-collection xmlns:d="DAV:"><d:sync-token>{token}</d:sync-token>'
+    '<d:sync-level>1</d:sync-level><d:prop><d:getetag/></d:prop></d:sync-collection>'
+)
+
+
+class DavError(Exception):
+    def __init__(self, method: str, path: str, status: int, body=b''):
+        super().__init__(f"{method} {path} returned {status}")
+        self.message = f"{method} {path} returned {status}: {body[:200]!r}"
+        self.status = status
+        self.body = body
+
+
+class ConnectionPool:
+    """Keep-alive connections to one server, shared by any number of threads.
+
+    Every request takes an idle connection or opens a new one, so the pool grows to the number of
+    concurrent requests and no further.
+    """
+
+    def __init__(self, base_url: str, timeout=DAV_TIMEOUT_SEC):
+        url = urllib.parse.urlsplit(base_url)
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.base_path = normalize_path(url.path.rstrip('/'))
+        self.timeout = timeout
+        # Test instances use self signed certificates, same as ignore_https_errors in the browser pool
+        self.ssl_context = ssl._create_unverified_context() if url.scheme == 'https' else None
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.opened = 0
+
+    def _connect(self) -> http.client.HTTPConnection:
+        with self.lock:
+            self.opened += 1
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self.ssl_context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method: str, path: str, body=None, headers=None, sink=None):
+        # With a sink the body is handed over in pieces as it arrives instead of being returned
+        retry = body is None or isinstance(body, bytes)
+        while True:
+            try:
+                connection, reused = self.idle.get_nowait(), True
+            except queue.Empty:
+                connection, reused = self._connect(), False
+            try:
+                connection.request(method, self.base_path + path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                if sink is None:
+                    data = response.read()
+                else:
+                    data = b''
+                    while chunk := response.read(READ_SIZE):
+                        sink(chunk)
+            except STALE_CONNECTION_ERRORS:
+                connection.close()
+                # The server closes idle keep-alive connections whenever it likes
+                if reused and retry:
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                self.idle.put(connection)
+            return response.status, response.headers, data
+
+    def close(self) -> None:
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def normalize_path(path: str) -> str:
+    # Servers escape hrefs their own way, e.g. '@' or not. Quoting the unquoted path the way dav_path() does
+    # makes hrefs comparable with the paths the requests were made with.
+    return urllib.parse.quote(urllib.parse.unquote(path))
+
+
+def response_href(response: ET.Element) -> str:
+    return normalize_path(response.findtext('d:href', '', NAMESPACES))
+
+
+def response_properties(response: ET.Element) -> dict:
+    # {property name without namespace: text, or the element if it has children} of every successful propstat
+    properties = {}
+    for propstat in response.findall('d:propstat', NAMESPACES):
+        prop_element = propstat.find('d:prop', NAMESPACES)
+        if prop_element is None or propstat.findtext('d:status', '', NAMESPACES).split()[1:2] != ['200']:
+            continue
+        for prop in prop_element:
+            properties[prop.tag.rpartition('}')[2]] = prop.text if len(prop) == 0 else prop
+    return properties
+
+
+def parse_multistatus(data: bytes) -> dict:
+    # href -> properties
+    return {response_href(response): response_properties(response) for response in ET.fromstring(data).findall('d:response', NAMESPACES)}
+
+
+class DavClient:
+    """WebDAV and OCS requests as one user. Every request is timed into the latency report under its name."""
+
+    def __init__(self, base_url: str, username='nextcloud', password='nextcloud', pool=None, scenario=None):
+        self.base_url = base_url.rstrip('/')
+        self.pool = pool or ConnectionPool(base_url)
+        self.username = username
+        self.authorization = 'Basic ' + base64.b64encode(f"{username}:{password}".encode()).decode()
+        # Worker threads don't see the labels of the thread that created the client
+        self.scenario = scenario or get_labels().get('scenario', latency.SCRIPT_NAME)
+
+    def request(self, method: str, path: str, body=None, headers=None, expect=(200, 201, 204, 207), name=None, auth=True, sink=None):
+        headers = dict(headers or {})
+        if auth:
+            headers['Authorization'] = self.authorization
+        started = perf_counter_ns()
+        status, response_headers, data = self.pool.request(method, path, body, headers, sink)
+        latency.record(self.scenario, name or f"{method} request", (perf_counter_ns() - started) // 1000)
+        events.count('requests')
+        if expect and status not in expect:
+            raise DavError(method, path, status, data)
+        return status, response_headers, data
+
+    def multistatus(self, data: bytes) -> dict:
+        # Normalized hrefs without the path of an instance in a subdirectory, so they match the paths the requests were made with
+        return {href.removeprefix(self.pool.base_path): properties for href, properties in parse_multistatus(data).items()}
+
+    def dav_path(self, root: str, path='') -> str:
+        return f"/remote.php/dav/{root}/{urllib.parse.quote(self.username)}/{urllib.parse.quote(path.lstrip('/'))}"
+
+    def addressbook_path(self, addressbook: str, path='') -> str:
+        return f"/remote.php/dav/addressbooks/users/{urllib.parse.quote(self.username)}/{urllib.parse.quote(addressbook)}/{urllib.parse.quote(path.lstrip('/'))}"
+
+    def files_path(self, path='') -> str:
+        return self.dav_path('files', path)
+
+    def upload(self, path: str, data, size=None, headers=None) -> None:
+        # data may be bytes or an iterable of bytes, which is streamed and then needs the size
+        size = len(data) if size is None else size
+        self.request('PUT', self.files_path(path), data, {'Content-Length': str(size), **(headers or {})}, name='DAV PUT')
+
+    def propfind(self, path: str, depth=0, properties=('d:getcontentlength', 'd:getetag', 'd:getlastmodified', 'oc:fileid')) -> dict:
+        body = (
+            '<?xml version="1.0"?><d:propfind xmlns:d="DAV:" xmlns:oc="http://owncloud.org/ns" xmlns:nc="http://nextcloud.org/ns">'
+            f"<d:prop>{''.join(f'<{prop}/>' for prop in properties)}</d:prop></d:propfind>"
+        ).encode()
+        _, _, data = self.request('PROPFIND', self.files_path(path), body, {'Depth': str(depth), 'Content-Type': 'application/xml'}, expect=(207,), name='DAV PROPFIND')
+        return self.multistatus(data)
+
+    def download(self, path: str, sink=None) -> bytes:
+        return self.request('GET', self.files_path(path), expect=(200,), name='DAV GET', sink=sink)[2]
+
+    def delete(self, path: str) -> None:
+        self.request('DELETE', self.files_path(path), expect=(204,), name='DAV DELETE')
+
+    def mkcol(self, path: str, headers=None, name='DAV MKCOL') -> None:
+        self.request('MKCOL', path, headers=headers, expect=(201,), name=name)
+
+    def move(self, source: str, destination: str, headers=None, name='DAV MOVE') -> None:
+        self.request('MOVE', source, headers={'Destination': self.base_url + destination, **(headers or {})}, expect=(201, 204), name=name)
+
+    def put_object(self, path: str, data: bytes, content_type: str, etag=None, name='DAV PUT object') -> str:
+        # Calendar and address book objects: create only if new, update only if unchanged since etag. Returns the new etag.
+        headers = {'Content-Type': content_type, **({'If-Match': etag} if etag else {'If-None-Match': '*'})}
+        _, response_headers, _ = self.request('PUT', path, data, headers, expect=(201, 204), name=name)
+        return response_headers.get('ETag')
+
+    def delete_object(self, path: str, etag=None, name='DAV DELETE object') -> None:
+        self.request('DELETE', path, headers={'If-Match': etag} if etag else None, expect=(204,), name=name)
+
+    def report(self, path: str, body: str, depth=1, name='DAV REPORT') -> dict:
+        _, _, data = self.request('REPORT', path, body.encode(), {'Depth': str(depth), 'Content-Type': 'application/xml; charset=utf-8'}, expect=(207,), name=name)
+        return self.multistatus(data)
+
+    def sync_collection(self, path: str, token='', name='DAV sync-collection') -> tuple:
+        # RFC 6578: everything that changed since token, an empty token returns all objects. Returns (new token, changed, removed).
+        body = SYNC_COLLECTION.format(token=token).encode()
+        _, _, data = self.request('REPORT', path, body, {'Depth': '0', 'Content-Type': 'application/xml; charset=utf-8'}, expect=(207,), name=name)
+        root = ET.fromstring(data)
+        changed, removed = {}, []
+        for response in root.findall('d:response', NAMESPACES):
+            href = response_href(response).removeprefix(self.pool.base_path)
+            if response.findtext('d:status', '', NAMESPACES).split()[1:2] == ['404']:
+                removed.append(href)
+            else:
+                changed[href] = response_properties(response)
+        return root.findtext('d:sync-token', '', NAMESPACES), changed, removed
+
+    def ocs(self, method: str, path: str, params=None, name=None, expect=(200,)):
+        # v2 OCS endpoints answer with the real HTTP status, so expect works as for WebDAV
+        body = urllib.parse.urlencode(params, doseq=True).encode() if params else None
+        headers = {'OCS-APIRequest': 'true', 'Accept': 'application/json'}
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        _, _, data = self.request(method, f"/ocs/v2.php/{path.lstrip('/')}", body, headers, expect=expect, name=name or f"OCS {method} {path}")
+        return json.loads(data)['ocs']['data'] if data else None
+
+    def share_link(self, path: str) -> str:
+        share = self.ocs('POST', 'apps/files_sharing/api/v1/shares', {'path': '/' + path.lstrip('/'), 'shareType': 3}, name='OCS create share link')
+        return share['url']
+
+    def public_download(self, share_url: str, sink=None) -> bytes:
+        # Share URLs are absolute, the pool only takes the path below its base URL
+        path = urllib.parse.urlsplit(share_url).path.removeprefix(self.pool.base_path)
+        return self.request('GET', f"{path}/download", expect=(200,), name='Public download', auth=False, sink=sink)[2]
@@ -0,0 +1,379 @@
+import hashlib
+import json
+import re
+import secrets
+import socket
+import sys
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+# In memory stand-in for the parts of Nextcloud the protocol drivers use, so they can be tried without a server:
+#   python3 master/nextcloud_files_dav.py --stub
+# It accepts any user and password and keeps everything in memory until it is stopped.
+
+MULTISTATUS = (
+    '<?xml version="1.0"?><d:multistatus xmlns:d="DAV:" xmlns:oc="http://owncloud.org/ns" '
+    'xmlns:cal="urn:ietf:params:xml:ns:caldav" xmlns:card="urn:ietf:params:xml:ns:carddav">{}</d:multistatus>'
+)
+
+
+TEXT_SESSION = r'/index\.php/apps/text/session/(?:create|(\d+)/(push|sync|close))'
+HOME_COLLECTIONS = r'/remote\.php/dav/(?:[a-z-]+/[^/]+|calendars/[^/]+/personal|addressbooks/users/[^/]+(?:/contacts)?)'
+
+
+def etag(data: bytes) -> str:
+    return f'"{hashlib.md5(data).hexdigest()}"'
+
+
+class StubDavHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # keep-alive, like the real server
+
+    def setup(self):
+        super().setup()
+        # Headers and body are separate writes, which Nagle and delayed ACKs would hold back by 40ms
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def path_only(self) -> str:
+        return urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+
+    def body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def reply(self, status: int, body=b'', content_type='text/plain', headers=None) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def authorized(self) -> bool:
+        if self.headers.get('Authorization', '').startswith('Basic '):
+            return True
+        self.body()
+        self.reply(401, headers={'WWW-Authenticate': 'Basic realm="stub"'})
+        return False
+
+    def precondition_failed(self, path: str) -> bool:
+        # If-None-Match: * only creates, If-Match only changes what the client has seen last, as sync clients use them
+        current = self.server.files.get(path)
+        if self.headers.get('If-None-Match') == '*' and current is not None:
+            return True
+        return 'If-Match' in self.headers and (current is None or etag(current) != self.headers['If-Match'])
+
+    def multistatus(self, entries, extra='') -> None:
+        # entries are (href, properties as XML), properties None for objects that are gone
+        responses = ''.join(
+            f"<d:response><d:href>{escape(urllib.parse.quote(href))}</d:href>"
+            + ("<d:status>HTTP/1.1 404 Not Found</d:status>" if properties is None else
+                f"<d:propstat><d:prop>{properties}</d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat>")
+            + "</d:response>"
+            for href, properties in entries
+        )
+        self.reply(207, MULTISTATUS.format(responses + extra).encode(), 'application/xml; charset=utf-8')
+
+    def do_PUT(self):
+        if not self.authorized():
+            return
+        if re.fullmatch(TEXT_SESSION, self.path_only):
+            self.text_session()
+            return
+        data, path = self.body(), self.path_only
+        with self.server.lock:
+            if self.precondition_failed(path):
+                failed = True
+            else:
+                failed, created = False, path not in self.server.files
+                self.server.files[path] = data
+                self.server.fileids.setdefault(path, len(self.server.fileids) + 1)
+                self.server.changes.append(path)
+        if failed:
+            self.reply(412)
+        else:
+            self.reply(201 if created else 204, headers={'ETag': etag(data)})
+
+    def do_GET(self):
+        path = self.path_only
+        if path.startswith('/ocs/v2.php/cloud/'):
+            if self.authorized():
+                self.ocs_user_or_group()
+            return
+        if path == '/index.php/csrftoken':
+            if self.authorized():
+                self.reply(200, json.dumps({'token': secrets.token_urlsafe(16)}).encode(), 'application/json', {'Set-Cookie': 'nc_session_id=stub; path=/; HttpOnly'})
+            return
+        if path.startswith('/s/') and path.endswith('/download'):
+            source = self.server.shares.get(path.split('/')[2])
+        elif self.authorized():
+            source = path
+        else:
+            return
+        data = self.server.files.get(source)
+        if data is None:
+            self.reply(404)
+        else:
+            self.reply(200, data, 'application/octet-stream')
+
+    def do_PROPFIND(self):
+        if not self.authorized():
+            return
+        self.body()
+        path = self.path_only
+        with self.server.lock:
+            if path in self.server.files:
+                entries = [(path, self.server.files[path])]
+            elif self.server.is_collection(path.rstrip('/')):
+                prefix = path.rstrip('/') + '/'
+                entries = [(prefix, None)]
+                if self.headers.get('Depth', '1') != '0':
+                    entries += [(name, data) for name, data in self.server.files.items() if name.startswith(prefix) and '/' not in name[len(prefix):]]
+                    entries += [(name + '/', None) for name in self.server.collections if name.startswith(prefix) and '/' not in name[len(prefix):]]
+            else:
+                entries = []
+        if not entries:
+            self.reply(404)
+            return
+        self.multistatus(
+            (name, '<d:resourcetype><d:collection/></d:resourcetype>' if data is None else
+                f'<d:resourcetype/><d:getcontentlength>{len(data)}</d:getcontentlength><d:getetag>{escape(etag(data))}</d:getetag>'
+                f'<oc:fileid>{self.server.fileids.get(name, 0)}</oc:fileid>')
+            for name, data in entries
+        )
+
+    def do_REPORT(self):
+        # Every query simply returns all objects of the collection, filters like time ranges are ignored
+        if not self.authorized():
+            return
+        body = self.body().decode()
+        collection = self.path_only.rstrip('/') + '/'
+        if 'sync-collection' in body:
+            self.sync_collection(collection, re.search(r'sync-token>([^<]*)<', body)[1])
+            return
+        data_element = 'card:address-data' if collection.startswith('/remote.php/dav/addressbooks/') else 'cal:calendar-data'
+        with self.server.lock:
+            objects = [(name, data) for name, data in self.server.files.items() if name.startswith(collection) and '/' not in name[len(collection):]]
+        self.multistatus(
+            (name, f"<d:getetag>{escape(etag(data))}</d:getetag><{data_element}>{escape(data.decode())}</{data_element}>")
+            for name, data in objects
+        )
+
+    def sync_collection(self, collection: str, token: str) -> None:
+        # Tokens are positions in the change log, an empty token means everything that is there now
+        with self.server.lock:
+            revision = len(self.server.changes)
+            if token:
+                paths = dict.fromkeys(path for path in self.server.changes[int(token.rpartition('/')[2]):] if path.startswith(collection) and '/' not in path[len(collection):])
+            else:
+                paths = dict.fromkeys(path for path in self.server.files if path.startswith(collection) and '/' not in path[len(collection):])
+            entries = [(path, f"<d:getetag>{escape(etag(self.server.files[path]))}</d:getetag>" if path in self.server.files else None) for path in paths]
+        self.multistatus(entries, f"<d:sync-token>http://sabre.io/ns/sync/{revision}</d:sync-token>")
+
+    def do_DELETE(self):
+        if not self.authorized():
+            return
+        if self.path_only.startswith('/ocs/v2.php/cloud/'):
+            self.ocs_user_or_group(delete=True)
+            return
+        if self.path_only.startswith('/ocs/v2.php/apps/spreed/api/v4/room/'):
+            with self.server.lock:
+                found = self.server.rooms.pop(self.path_only.rpartition('/')[2], None) is not None
+            self.ocs(200 if found else 404, None)
+            return
+        path = self.path_only.rstrip('/')
+        with self.server.lock:
+            failed = 'If-Match' in self.headers and self.precondition_failed(path)
+            found = not failed and (self.server.files.pop(path, None) is not None or path in self.server.collections)
+            if found:
+                self.server.changes.append(path)
+                for name in [name for name in self.server.files if name.startswith(path + '/')]:
+                    del self.server.files[name]
+                self.server.collections -= {name for name in self.server.collections if name == path or name.startswith(path + '/')}
+        self.reply(412 if failed else 204 if found else 404)
+
+    def do_MKCOL(self):
+        if not self.authorized():
+            return
+        self.body()
+        path = self.path_only.rstrip('/')
+        with self.server.lock:
+            exists = path in self.server.collections
+            self.server.collections.add(path)
+        self.reply(405 if exists else 201)
+
+    def do_MOVE(self):
+        if not self.authorized():
+            return
+        source = self.path_only.rstrip('/')
+        destination = urllib.parse.unquote(urllib.parse.urlsplit(self.headers['Destination']).path)
+        with self.server.lock:
+            if source.endswith('/.file'):
+                # Chunked upload: the chunks in the upload collection are joined in the order of their numbers
+                collection = source[:-len('/.file')] + '/'
+                chunks = sorted((name for name in self.server.files if name.startswith(collection)), key=lambda name: int(name.rpartition('/')[2]))
+                data = b''.join(self.server.files.pop(name) for name in chunks)
+                self.server.collections.discard(collection.rstrip('/'))
+            else:
+                data = self.server.files.pop(source, None)
+            if data is not None:
+                created = destination not in self.server.files
+                self.server.files[destination] = data
+        if data is None:
+            self.reply(404)
+        else:
+            self.reply(201 if created else 204)
+
+    def do_POST(self):
+        if not self.authorized():
+            return
+        if re.fullmatch(TEXT_SESSION, self.path_only):
+            self.text_session()
+            return
+        params = urllib.parse.parse_qs(self.body().decode())
+        path = self.path_only
+        if path == '/ocs/v2.php/apps/files_sharing/api/v1/shares':
+            self.create_share(params['path'][0], params.get('shareWith', [None])[0])
+        elif path == '/ocs/v2.php/apps/spreed/api/v4/room':
+            token = secrets.token_hex(4)
+            with self.server.lock:
+                self.server.rooms[token] = params['roomName'][0]
+            self.ocs(201, {'token': token, 'name': params['roomName'][0], 'type': int(params['roomType'][0])})
+        elif path == '/ocs/v2.php/cloud/users':
+            with self.server.lock:
+                exists = params['userid'][0] in self.server.users
+                missing_groups = set(params.get('groups[]', [])) - self.server.groups
+                if not exists and not missing_groups:
+                    self.server.users[params['userid'][0]] = set(params.get('groups[]', []))
+            # Same status codes as Nextcloud: 102 user exists, 104 group does not exist
+            if exists:
+                self.ocs(400, None, 102)
+            elif missing_groups:
+                self.ocs(400, None, 104)
+            else:
+                self.ocs(200, {'id': params['userid'][0]})
+        elif path == '/ocs/v2.php/cloud/groups':
+            with self.server.lock:
+                exists = params['groupid'][0] in self.server.groups
+                self.server.groups.add(params['groupid'][0])
+            if exists:
+                self.ocs(400, None, 102)
+            else:
+                self.ocs(200, [])
+        else:
+            self.reply(404)
+
+    def text_session(self) -> None:
+        # The Text app only stores and hands out steps, merging them is up to the editors
+        request = json.loads(self.body() or b'{}')
+        document_id, action = re.fullmatch(TEXT_SESSION, self.path_only).groups()
+        with self.server.lock:
+            if action is None:
+                document_id = request['fileId']
+                session = {'id': len(self.server.text_sessions) + 1, 'token': secrets.token_urlsafe(16), 'documentId': document_id}
+                self.server.text_sessions[session['id']] = session
+                steps = self.server.text_steps.setdefault(document_id, [])
+                response = {'session': session, 'document': {'id': document_id, 'lastSavedVersion': 0, 'currentVersion': len(steps)}, 'content': ''}
+            else:
+                session = self.server.text_sessions.get(request['sessionId'])
+                steps = self.server.text_steps.get(int(document_id))
+                if session is None or steps is None or session['token'] != request['sessionToken']:
+                    response = None
+                elif action == 'push':
+                    steps += [{'id': len(steps) + 1, 'version': len(steps) + 1, 'data': [step], 'sessionId': session['id']} for step in request['steps']]
+                    response = []
+                elif action == 'sync':
+                    response = {'steps': steps[request['version']:], 'sessions': [], 'document': {'id': int(document_id), 'currentVersion': len(steps)}}
+                else:
+                    del self.server.text_sessions[session['id']]
+                    response = []
+        if response is None:
+            self.reply(403)
+        else:
+            self.reply(200, json.dumps(response).encode(), 'application/json')
+
+    def create_share(self, path: str, share_with=None) -> None:
+        with self.server.lock:
+            source = next((name for name in self.server.files if name.endswith('/' + path.lstrip('/')) and name.startswith('/remote.php/dav/files/')), None)
+            token = secrets.token_urlsafe(10)
+            if source is not None and share_with is None:
+                self.server.shares[token] = source
+        if source is None:
+            self.ocs(404, None)
+        elif share_with is not None:
+            self.ocs(200, {'id': token, 'path': path, 'share_type': 0, 'share_with': share_with})
+        else:
+            self.ocs(200, {'id': token, 'token': token, 'url': f"http://{self.headers['Host']}/s/{token}", 'path': path, 'share_type': 3})
+
+    def ocs_user_or_group(self, delete=False) -> None:
+        # GET and DELETE of /ocs/v2.php/cloud/users/<id> and /ocs/v2.php/cloud/groups/<id>
+        kind, _, name = self.path_only.removeprefix('/ocs/v2.php/cloud/').partition('/')
+        with self.server.lock:
+            if kind == 'users':
+                groups = self.server.users.pop(name, None) if delete else self.server.users.get(name)
+                found = groups is not None
+            else:
+                found = name in self.server.groups
+                if delete:
+                    self.server.groups.discard(name)
+        # Nextcloud answers 404/998 when getting a missing user, but 400/101 when deleting one
+        if not found and delete:
+            self.ocs(400, None, 101)
+        elif not found:
+            self.ocs(404, None, 998)
+        elif kind == 'users' and not delete:
+            self.ocs(200, {'id': name, 'groups': sorted(groups)})
+        else:
+            self.ocs(200, [])
+
+    def ocs(self, status: int, data, statuscode=None) -> None:
+        statuscode = statuscode or status
+        body = json.dumps({'ocs': {'meta': {'status': 'ok' if status == 200 else 'failure', 'statuscode': statuscode}, 'data': data}}).encode()
+        self.reply(status, body, 'application/json')
+
+
+class StubDavServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many workers connect at once, with the default backlog of 5 their SYNs are dropped and retried after a second
+    request_queue_size = 128
+
+    def __init__(self, address=('127.0.0.1', 0), handler=StubDavHandler):
+        super().__init__(address, handler)
+        self.lock = threading.Lock()
+        self.files = {} # path -> content
+        self.collections = set()
+        self.shares = {} # token -> path
+        self.changes = [] # paths in the order they were changed, for sync-collection
+        self.users = {} # user -> groups
+        self.groups = set()
+        self.rooms = {} # Talk conversation token -> name
+        self.fileids = {} # path -> oc:fileid
+        self.text_sessions = {} # Text session id -> session
+        self.text_steps = {} # file id -> steps, a step's version is its position
+
+    def is_collection(self, path: str) -> bool:
+        # Home collections like /remote.php/dav/files/<user> and the default calendar and address book always exist
+        return path in self.collections or re.fullmatch(HOME_COLLECTIONS, path) is not None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+
+def start_stub_server(host='127.0.0.1', port=0) -> StubDavServer:
+    server = StubDavServer((host, port))
+    threading.Thread(target=server.serve_forever, name='stub-dav-server', daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    server = StubDavServer(('127.0.0.1', port))
+    print(f"Stub server listening on {server.url}")
+    server.serve_forever()
@@ -0,0 +1,174 @@
+import atexit
+import contextlib
+import contextvars
+import json
+import os
+import queue
+import sys
+import threading
+from collections import Counter
+from time import time_ns, perf_counter_ns, monotonic
+
+# Path of the JSONL file with all notes and phases. Without it only the GMT note lines are written to stdout.
+EVENT_LOG_PATH = os.environ.get('NC_EVENT_LOG')
+FLUSH_INTERVAL_SEC = 0.5
+
+DEFAULT_LABELS = {'scenario': os.path.splitext(os.path.basename(sys.argv[0]))[0]}
+
+_labels = contextvars.ContextVar('event_labels', default=DEFAULT_LABELS)
+
+
+def get_labels() -> dict:
+    return _labels.get()
+
+
+def set_labels(**labels) -> None:
+    _labels.set({**_labels.get(), **labels})
+
+
+@contextlib.contextmanager
+def labels(**labels):
+    token = _labels.set({**_labels.get(), **labels})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def labelled(function, **labels):
+    # Threads of an executor start with the default labels, so the caller's labels (plus labels) go along with function
+    merged = {**_labels.get(), **labels}
+
+    def run(*args, **kwargs):
+        token = _labels.set(merged)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _labels.reset(token)
+    return run
+
+
+class EventLog:
+    """Turns notes into phases (from one note to the next) and writes them from a background thread.
+
+    Every note is still printed as "<timestamp> <message>" so GMT can read it from stdout.
+    Listeners are called with each finished phase before it is written and may add data to it.
+    """
+
+    def __init__(self, path=None, stream=sys.stdout):
+        self.path = path
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.phase = None
+        self.counters = Counter()
+        self.listeners = []
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._write, name='event-log-writer', daemon=True)
+        self.thread.start()
+
+    def add_listener(self, listener) -> None:
+        self.listeners.append(listener)
+
+    def note(self, message: str, kind='phase') -> None:
+        # A note ends the running phase and only 'phase' notes start a new one, 'sleep' notes mark idle time.
+        # 'result' notes are annotations that leave the running phase alone, so they can come from concurrent tasks.
+        labels = get_labels()
+        if kind != 'result':
+            self.end_phase()
+        # The new phase starts after the listeners of the old one ran, so the time they take (browser metrics
+        # evaluate a script in every open page) is not counted in either phase
+        wall_ns, mono_ns = time_ns(), perf_counter_ns()
+        if kind == 'phase':
+            with self.lock:
+                # Another thread may have started a phase while the listeners ran
+                finished = self._end_phase(wall_ns, mono_ns)
+                self.phase = {
+                    'type': 'phase', 'name': message, 'labels': labels,
+                    'start_wall_ns': wall_ns, 'start_mono_ns': mono_ns, 'counters': Counter(),
+                }
+            if finished is not None:
+                self._finish(finished)
+        self.queue.put(('note', wall_ns, {'type': 'note', 'kind': kind, 'message': message, 'labels': labels, 'wall_ns': wall_ns, 'mono_ns': mono_ns}))
+
+    def end_phase(self) -> None:
+        with self.lock:
+            finished = self._end_phase(time_ns(), perf_counter_ns())
+        if finished is not None:
+            self._finish(finished)
+
+    def current_phase(self):
+        return self.phase
+
+    def count(self, name: str, value=1) -> None:
+        with self.lock:
+            self.counters[name] += value
+            if self.phase is not None:
+                self.phase['counters'][name] += value
+
+    def _end_phase(self, wall_ns: int, mono_ns: int):
+        phase, self.phase = self.phase, None
+        if phase is not None:
+            phase['end_wall_ns'] = wall_ns
+            phase['end_mono_ns'] = mono_ns
+            phase['duration_ns'] = mono_ns - phase['start_mono_ns']
+        return phase
+
+    def _finish(self, phase: dict) -> None:
+        for listener in self.listeners:
+            listener(phase)
+        self.queue.put(('record', None, phase))
+
+    def _write(self) -> None:
+        jsonl = open(self.path, 'a', encoding='utf-8') if self.path else None
+        stopping = False
+        while not stopping:
+            flushed = []
+            # Collect for up to FLUSH_INTERVAL_SEC after the first item and write everything in one go
+            items = [self.queue.get()]
+            deadline = monotonic() + FLUSH_INTERVAL_SEC
+            with contextlib.suppress(queue.Empty):
+                while items[-1][0] not in ('stop', 'flush') and monotonic() < deadline:
+                    items.append(self.queue.get(timeout=max(deadline - monotonic(), 0)))
+
+            lines, records = [], []
+            for kind, wall_ns, record in items:
+                if kind == 'stop':
+                    stopping = True
+                    continue
+                if kind == 'flush':
+                    flushed.append(record)
+                    continue
+                if kind == 'note':
+                    lines.append(f"{str(wall_ns)[:16]} {record['message']}\n")
+                records.append(record)
+
+            if lines:
+                self.stream.write(''.join(lines))
+                self.stream.flush()
+            if jsonl is not None and records:
+                jsonl.write(''.join(json.dumps(record, default=str) + '\n' for record in records))
+                jsonl.flush()
+            for written in flushed:
+                written.set()
+
+        if jsonl is not None:
+            jsonl.close()
+
+    def flush(self) -> None:
+        # Blocks until everything noted so far is written, e.g. before printing a report to the same stream
+        if not self.thread.is_alive():
+            return
+        written = threading.Event()
+        self.queue.put(('flush', None, written))
+        written.wait()
+
+    def close(self) -> None:
+        if not self.thread.is_alive():
+            return
+        self.end_phase()
+        self.queue.put(('stop', None, None))
+        self.thread.join()
+
+
+events = EventLog(EVENT_LOG_PATH)
+atexit.register(events.close)
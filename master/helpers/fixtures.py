@@ -0,0 +1,116 @@
+import contextlib
+import os
+import random
+import string
+
+from helpers.dav_client import ConnectionPool, DavClient, DavError
+from helpers.helper_functions import log_note
+from helpers.payload import Payload
+from helpers.provisioning import ADMIN_USER, ADMIN_PASSWORD, create_group, delete_group, delete_user, ensure_user
+from helpers.session_cache import forget_session
+
+# Declarative preconditions for scenarios. They are created through OCS and WebDAV before the browser starts and
+# removed afterwards, so measured phases only contain the interaction under test. A spec looks like:
+#   {
+#     'users': [{'username': 'docs_dude', 'password': 'docsrule!12', 'email': 'docs_dude@local.host', 'groups': []}],
+#     'groups': ['docs'],
+#     'files': [{'path': 'Collaborative_doc_{suffix}.md', 'owner': 'nextcloud', 'content': ''}],
+#     'shares': [{'path': 'Collaborative_doc_{suffix}.md', 'owner': 'nextcloud', 'share_with': 'docs_dude'}],
+#     'conversations': [{'name': 'Random talk', 'owner': 'nextcloud', 'public': True}],
+#   }
+# {suffix} in paths and names is replaced by a random string per setup. Files take 'content' or a generated 'size'.
+# A share without share_with is a public link. Owners default to the admin.
+
+# NC_HYBRID=1 makes the runner and scenarios that support it set up their preconditions here instead of in the browser
+HYBRID = os.environ.get('NC_HYBRID', '0') == '1'
+
+SHARE_TYPE_USER = 0
+SHARE_TYPE_LINK = 3
+CONVERSATION_TYPE_GROUP = 2
+CONVERSATION_TYPE_PUBLIC = 3
+
+
+class Fixtures:
+    def __init__(self, domain: str, spec: dict):
+        self.domain = domain.rstrip('/')
+        self.spec = spec
+        self.suffix = ''.join(random.choices(string.ascii_letters + string.digits, k=5))
+        self.pool = ConnectionPool(domain)
+        self.passwords = {ADMIN_USER: ADMIN_PASSWORD, **{user['username']: user['password'] for user in spec.get('users', [])}}
+        self.clients = {}
+        # What setup() made, for the scenario and for teardown(). Things that existed before are not removed.
+        self.created = {'users': [], 'groups': [], 'files': {}, 'shares': {}, 'conversations': {}}
+
+    def client(self, username=ADMIN_USER) -> DavClient:
+        if username not in self.clients:
+            self.clients[username] = DavClient(self.domain, username, self.passwords[username], self.pool)
+        return self.clients[username]
+
+    def name(self, template: str) -> str:
+        return template.replace('{suffix}', self.suffix)
+
+    def setup(self) -> dict:
+        admin = self.client()
+        for group in self.spec.get('groups', []):
+            if create_group(admin, group):
+                self.created['groups'].append(group)
+
+        for user in self.spec.get('users', []):
+            if ensure_user(admin, user['username'], user['password'], user.get('groups', []), user.get('display_name'), user.get('email')):
+                self.created['users'].append(user['username'])
+
+        for file in self.spec.get('files', []):
+            path, owner = self.name(file['path']), file.get('owner', ADMIN_USER)
+            data = file['content'].encode() if 'content' in file else Payload(file['size']).bytes()
+            self.client(owner).upload(path, data)
+            self.created['files'][path] = owner
+
+        for share in self.spec.get('shares', []):
+            path, owner = self.name(share['path']), share.get('owner', ADMIN_USER)
+            if 'share_with' in share:
+                params = {'path': '/' + path, 'shareType': SHARE_TYPE_USER, 'shareWith': share['share_with']}
+            else:
+                params = {'path': '/' + path, 'shareType': SHARE_TYPE_LINK}
+            self.created['shares'][path] = self.client(owner).ocs('POST', 'apps/files_sharing/api/v1/shares', params, name='OCS create share')
+
+        for conversation in self.spec.get('conversations', []):
+            name, owner = self.name(conversation['name']), conversation.get('owner', ADMIN_USER)
+            room_type = CONVERSATION_TYPE_PUBLIC if conversation.get('public', True) else CONVERSATION_TYPE_GROUP
+            room = self.client(owner).ocs('POST', 'apps/spreed/api/v4/room', {'roomType': room_type, 'roomName': name}, name='OCS create conversation', expect=(200, 201))
+            self.created['conversations'][name] = {**room, 'owner': owner, 'url': f"{self.domain}/call/{room['token']}"}
+
+        return self.created
+
+    def teardown(self) -> None:
+        # Reverse order, and every step on its own so one failure does not leave the rest behind
+        for name, room in self.created['conversations'].items():
+            with contextlib.suppress(DavError):
+                self.client(room['owner']).ocs('DELETE', f"apps/spreed/api/v4/room/{room['token']}", name='OCS delete conversation')
+
+        # Deleting a file removes its shares as well
+        for path, owner in self.created['files'].items():
+            with contextlib.suppress(DavError):
+                self.client(owner).delete(path)
+
+        admin = self.client()
+        for username in self.created['users']:
+            with contextlib.suppress(DavError):
+                delete_user(admin, username)
+            forget_session(username, self.domain)
+        for group in self.created['groups']:
+            with contextlib.suppress(DavError):
+                delete_group(admin, group)
+
+        self.pool.close()
+
+
+@contextlib.contextmanager
+def fixtures(domain: str, spec: dict):
+    # Notes of their own kind end the running phase without starting one, so setup and teardown are never measured
+    fixture = Fixtures(domain, spec)
+    log_note("Setting up fixtures", kind='fixture')
+    try:
+        yield fixture.setup()
+    finally:
+        log_note("Tearing down fixtures", kind='fixture')
+        fixture.teardown()
@@ -1,9 +1,29 @@
+import asyncio
 import contextlib
+import os
 import random
 import string
-from time import time_ns, sleep
+import weakref
+from time import sleep
 from playwright.sync_api import TimeoutError
 
+from helpers import think_time
+from helpers.event_log import events
+from helpers import latency # noqa: F401 -- imported for its listener, which records every phase into the latency report written at exit
+
+# In fast mode user_sleep() waits for the UI to settle (network idle or a given condition) instead of a fixed delay.
+# Think time on top of that is set separately with NC_THINK_TIME.
+FAST_MODE = os.environ.get('NC_FAST_MODE', '0') == '1'
+THINK_TIME_SEC = float(os.environ.get('NC_THINK_TIME', 0))
+NETWORK_IDLE_MS = int(os.environ.get('NC_NETWORK_IDLE_MS', 500))
+NETWORK_IDLE_TIMEOUT_MS = int(os.environ.get('NC_NETWORK_IDLE_TIMEOUT_MS', 15_000))
+NETWORK_POLL_MS = 50
+
+# Long polling requests never finish while the app is open, so they must not keep the network from being idle
+LONG_POLLING_REQUESTS = ['lookIntoFuture=1', '/signaling/', '/apps/notify_push/', '/apps/text/session/']
+
+_inflight_requests = weakref.WeakKeyDictionary() # context -> set of requests that have not finished yet
+
 
 def login_nextcloud(page, username='nextcloud', password='nextcloud', domain='https://ncs'):
     page.goto(f"{domain}/login")
@@ -14,11 +34,16 @@ def login_nextcloud(page, username='nextcloud', password='nextcloud', domain='ht
 
 def get_random_text(size_in_bytes)  -> str:
     characters = string.ascii_letters + string.digits
-    return ''.join(random.choice(characters) for _ in range(size_in_bytes))
+    return ''.join(random.choices(characters, k=size_in_bytes))
+
+_last_note = ''
 
-def log_note(message: str) -> None:
-    timestamp = str(time_ns())[:16]
-    print(f"{timestamp} {message}")
+def log_note(message: str, kind='phase') -> None:
+    # Printed as "<timestamp> <message>" for GMT by the event log's background writer
+    global _last_note
+    if kind == 'phase':
+        _last_note = message
+    events.note(message, kind)
 
 
 def close_modal(page) -> None:
@@ -31,6 +56,86 @@ def close_modal(page) -> None:
 def timeout_handler(signum, frame):
     raise TimeoutError("Page.content() timed out")
 
-def user_sleep(delay=5):
-    log_note(f"Sleeping for {delay}s")
+def track_requests(context) -> None:
+    inflight = _inflight_requests.setdefault(context, set())
+
+    def started(request):
+        if not any(pattern in request.url for pattern in LONG_POLLING_REQUESTS):
+            inflight.add(request)
+
+    context.on("request", started)
+    context.on("requestfinished", inflight.discard)
+    context.on("requestfailed", inflight.discard)
+
+
+def _as_list(pages) -> list:
+    if pages is None:
+        return []
+    return pages if isinstance(pages, (list, tuple)) else [pages]
+
+
+def wait_for_network_idle(page, idle_ms=NETWORK_IDLE_MS, timeout_ms=NETWORK_IDLE_TIMEOUT_MS) -> None:
+    inflight = _inflight_requests.get(page.context)
+    if inflight is None:
+        page.wait_for_load_state('networkidle')
+        return
+
+    waited = idle = 0
+    while idle < idle_ms and waited < timeout_ms:
+        page.wait_for_timeout(NETWORK_POLL_MS) # also lets Playwright deliver the request events
+        waited += NETWORK_POLL_MS
+        idle = 0 if inflight else idle + NETWORK_POLL_MS
+
+
+async def wait_for_network_idle_async(page, idle_ms=NETWORK_IDLE_MS, timeout_ms=NETWORK_IDLE_TIMEOUT_MS) -> None:
+    inflight = _inflight_requests.get(page.context)
+    if inflight is None:
+        await page.wait_for_load_state('networkidle')
+        return
+
+    waited = idle = 0
+    while idle < idle_ms and waited < timeout_ms:
+        await asyncio.sleep(NETWORK_POLL_MS / 1000)
+        waited += NETWORK_POLL_MS
+        idle = 0 if inflight else idle + NETWORK_POLL_MS
+
+
+def think_delay(delay, action=None) -> float:
+    # Without a think time model the fixed delay is used. The action defaults to the phase the last note started.
+    if think_time.model is None:
+        return delay
+    return think_time.model.sample(action or _last_note, delay)
+
+
+def user_sleep(delay=5, page=None, until=None, action=None):
+    action = action or _last_note
+    if FAST_MODE:
+        # Waiting is best effort, a UI that never settles is caught by the next expect() anyway
+        with contextlib.suppress(TimeoutError):
+            if until is not None:
+                until()
+            for p in _as_list(page):
+                wait_for_network_idle(p)
+        delay = THINK_TIME_SEC
+
+    delay = think_delay(delay, action)
+    if FAST_MODE and not delay:
+        return
+    log_note(f"Sleeping for {delay:g}s", kind='sleep')
     sleep(delay)
+
+
+async def user_sleep_async(delay=5, page=None, until=None, action=None):
+    action = action or _last_note
+    if FAST_MODE:
+        with contextlib.suppress(TimeoutError):
+            if until is not None:
+                await until()
+            await asyncio.gather(*[wait_for_network_idle_async(p) for p in _as_list(page)])
+        delay = THINK_TIME_SEC
+
+    delay = think_delay(delay, action)
+    if FAST_MODE and not delay:
+        return
+    log_note(f"Sleeping for {delay:g}s", kind='sleep')
+    await asyncio.sleep(delay)
@@ -0,0 +1,116 @@
+import atexit
+import json
+import os
+import sys
+import threading
+from collections import defaultdict
+
+from helpers.event_log import events
+
+SCRIPT_NAME = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+LATENCY_REPORT = os.environ.get('NC_LATENCY_REPORT', f"/tmp/nextcloud_latency/{SCRIPT_NAME}.json")
+PERCENTILES = [50, 90, 99]
+
+
+class Histogram:
+    """HDR style histogram: exact below 2**sub_bucket_bits, above that log-linear buckets with a relative error of 2**-sub_bucket_bits."""
+
+    def __init__(self, sub_bucket_bits=7):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.buckets = defaultdict(int) # (shift, sub bucket) -> count
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _key(self, value: int):
+        shift = max(value.bit_length() - self.sub_bucket_bits, 0)
+        return shift, value >> shift
+
+    @staticmethod
+    def _bucket_value(key) -> int:
+        # Middle of the bucket, which keeps the error symmetric
+        shift, sub_bucket = key
+        return (sub_bucket << shift) + ((1 << shift) >> 1)
+
+    def record(self, value: int) -> None:
+        value = max(int(value), 0)
+        self.buckets[self._key(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percentile: float) -> int:
+        if not self.count:
+            return 0
+        rank = max(percentile / 100 * self.count, 1)
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen >= rank:
+                return min(max(self._bucket_value(key), self.min), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        summary = {'count': self.count, 'min': self.min, 'mean': self.total / self.count if self.count else 0}
+        summary.update({f"p{p}": self.percentile(p) for p in PERCENTILES})
+        summary['max'] = self.max
+        return summary
+
+    def to_dict(self) -> dict:
+        return {
+            **self.summary(),
+            'buckets': [[self._bucket_value(key), count] for key, count in sorted(self.buckets.items())],
+        }
+
+
+histograms = defaultdict(lambda: defaultdict(Histogram)) # scenario -> phase name -> latencies in µs
+_lock = threading.Lock()
+
+def record(scenario: str, name: str, value_us: int) -> None:
+    # Protocol drivers record single requests from many worker threads
+    with _lock:
+        histograms[scenario][name].record(value_us)
+
+
+def record_phase(phase: dict) -> None:
+    record(phase['labels'].get('scenario', SCRIPT_NAME), phase['name'], phase['duration_ns'] // 1000)
+
+
+def report() -> dict:
+    return {
+        'unit': 'us',
+        'scenarios': {
+            scenario: {name: histogram.to_dict() for name, histogram in phases.items()}
+            for scenario, phases in histograms.items()
+        },
+    }
+
+
+def print_report() -> None:
+    for scenario, phases in histograms.items():
+        print(f"Latency per phase for {scenario} (ms)")
+        print(f"  {'count':>6} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}  phase")
+        for name, histogram in phases.items():
+            summary = histogram.summary()
+            values = ' '.join(f"{summary[key] / 1000:9.1f}" for key in ('p50', 'p90', 'p99', 'max'))
+            print(f"  {summary['count']:>6} {values}  {name}")
+
+
+def write_report(path=LATENCY_REPORT) -> None:
+    # The last phase only ends here, so it has to be closed before the report is built. The notes still buffered
+    # in the event log go out first, the table comes after them on stdout.
+    events.end_phase()
+    events.flush()
+    if not histograms:
+        return
+    print_report()
+    if path:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report(), f, indent=2)
+
+
+events.add_listener(record_phase)
+atexit.register(write_report)
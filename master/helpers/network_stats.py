@@ -0,0 +1,161 @@
+import atexit
+import contextlib
+import json
+import os
+import re
+import sys
+import threading
+from collections import Counter, defaultdict
+from time import perf_counter
+
+from helpers.event_log import events, get_labels
+
+# Set NC_NETWORK_STATS=1 to count requests, bytes, status codes and per endpoint durations for every phase
+NETWORK_STATS = os.environ.get('NC_NETWORK_STATS', '0') == '1'
+SCRIPT_NAME = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+NETWORK_REPORT = os.environ.get('NC_NETWORK_REPORT', f"/tmp/nextcloud_network/{SCRIPT_NAME}.json")
+
+# Turns concrete URLs into endpoints, so e.g. every Talk chat request ends up in one line
+ENDPOINT_RULES = [
+    (re.compile(r'^/index\.php(?=/)'), ''),
+    (re.compile(r'^(/remote\.php/(?:dav|webdav))/([a-z-]+)/[^/]+(/.*)?$'), r'\1/\2/{user}/*'),
+    (re.compile(r'^(/ocs/v[12]\.php/apps/spreed/api/v\d+/(?:chat|room|call|signaling)/)[^/]+'), r'\1{token}'),
+    (re.compile(r'^(/(?:s|call)/)[^/]+'), r'\1{token}'),
+    (re.compile(r'/\d+(?=/|$)'), '/{id}'),
+    (re.compile(r'/[A-Za-z0-9_-]{20,}(?=/|$)'), '/{token}'),
+]
+
+
+def endpoint(method: str, url: str) -> str:
+    path = re.sub(r'^[a-z]+://[^/]+', '', url).split('?')[0].split('#')[0] or '/'
+    for pattern, replacement in ENDPOINT_RULES:
+        path = pattern.sub(replacement, path)
+    return f"{method} {path}"
+
+
+class NetworkStats:
+    def __init__(self):
+        self.requests = 0
+        self.failed = 0
+        self.bytes = 0
+        self.statuses = Counter()
+        self.endpoints = defaultdict(lambda: {'count': 0, 'bytes': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+
+    def add(self, name: str, status, size: int, duration_ms: float) -> None:
+        self.requests += 1
+        self.bytes += size
+        self.statuses[str(status)] += 1
+        if status == 'failed':
+            self.failed += 1
+        stats = self.endpoints[name]
+        stats['count'] += 1
+        stats['bytes'] += size
+        stats['total_ms'] += duration_ms
+        stats['max_ms'] = max(stats['max_ms'], duration_ms)
+
+    def to_dict(self) -> dict:
+        return {
+            'requests': self.requests,
+            'failed': self.failed,
+            'bytes': self.bytes,
+            'statuses': dict(self.statuses),
+            'endpoints': {
+                name: {**stats, 'total_ms': round(stats['total_ms'], 1), 'max_ms': round(stats['max_ms'], 1)}
+                for name, stats in sorted(self.endpoints.items(), key=lambda item: -item[1]['total_ms'])
+            },
+        }
+
+
+_lock = threading.Lock()
+_requests = {} # request -> (phase key, report key, name, start time, response status, response size)
+_phases = defaultdict(NetworkStats) # running or just ended phase -> stats of the requests that finished so far
+_pending = Counter() # phase key -> requests still running
+_report = defaultdict(lambda: defaultdict(NetworkStats)) # scenario -> phase name -> stats over the whole run
+
+
+def _phase_key(phase):
+    return (phase['start_mono_ns'], phase['name']) if phase is not None else None
+
+
+def _started(request) -> None:
+    phase = events.current_phase()
+    report_key = (get_labels().get('scenario', SCRIPT_NAME), phase['name'] if phase is not None else '(no phase)')
+    with _lock:
+        _requests[request] = [_phase_key(phase), report_key, endpoint(request.method, request.url), perf_counter(), None, 0]
+        if phase is not None:
+            _pending[_phase_key(phase)] += 1
+
+
+def _response(response) -> None:
+    with _lock:
+        if (entry := _requests.get(response.request)) is not None:
+            entry[4] = response.status
+            entry[5] = int(response.headers.get('content-length', 0) or 0)
+
+
+def _done(request, status=None, size=None) -> None:
+    with _lock:
+        entry = _requests.pop(request, None)
+    if entry is None:
+        return
+    phase_key, report_key, name, started, response_status, response_size = entry
+
+    timing = request.timing
+    duration_ms = timing['responseEnd'] if timing.get('responseEnd', -1) >= 0 else (perf_counter() - started) * 1000
+    status = status or response_status
+    size = response_size if size is None else size
+
+    with _lock:
+        # Once attach_stats has seen the phase its key is gone and the request only counts for the report
+        if phase_key in _pending:
+            _pending[phase_key] -= 1
+            _phases[phase_key].add(name, status, size, duration_ms)
+        _report[report_key[0]][report_key[1]].add(name, status, size, duration_ms)
+
+
+def instrument(context, exact_sizes=True) -> None:
+    def finished(request):
+        size = None
+        if exact_sizes:
+            # Transferred bytes need one more round trip to the driver, but gzip'ed responses have no content-length
+            with contextlib.suppress(Exception):
+                sizes = request.sizes()
+                size = sizes['responseHeadersSize'] + sizes['responseBodySize']
+        _done(request, size=size)
+
+    context.on("request", _started)
+    context.on("response", _response)
+    context.on("requestfinished", finished)
+    context.on("requestfailed", lambda request: _done(request, status='failed'))
+
+
+def attach_stats(phase: dict) -> None:
+    # Requests that are still running when the phase ends only show up in the report at exit
+    key = _phase_key(phase)
+    with _lock:
+        stats = _phases.pop(key, None)
+        pending = _pending.pop(key, 0)
+    if stats is not None or pending:
+        phase['network'] = {**(stats or NetworkStats()).to_dict(), 'pending': pending}
+
+
+def report() -> dict:
+    with _lock:
+        return {
+            scenario: {name: stats.to_dict() for name, stats in phases.items()}
+            for scenario, phases in _report.items()
+        }
+
+
+def write_report(path=NETWORK_REPORT) -> None:
+    events.end_phase()
+    if not _report or not path:
+        return
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report(), f, indent=2)
+
+
+if NETWORK_STATS:
+    events.add_listener(attach_stats)
+    atexit.register(write_report)
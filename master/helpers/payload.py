@@ -0,0 +1,126 @@
+import hashlib
+import os
+import random
+import re
+import string
+
+# Payloads are built from independently seeded blocks, so any range can be produced without generating what is before it
+PAYLOAD_SEED = os.environ.get('NC_PAYLOAD_SEED', '0')
+BLOCK_SIZE = 1024 * 1024
+
+TEXT_CHARACTERS = (string.ascii_letters + string.digits).encode()
+# Maps every byte value onto a letter or digit. 256 is not a multiple of 62, so the first few characters are slightly more frequent.
+TEXT_TABLE = bytes(TEXT_CHARACTERS[i % len(TEXT_CHARACTERS)] for i in range(256))
+
+
+class Payload:
+    """Deterministic content of any size.
+
+    compressibility is the share of every block that is a repeated filler instead of random bytes,
+    so 0 does not compress at all and 0.9 deflates to roughly a tenth. With text=True only letters and
+    digits are used, which compresses random content by about a quarter on its own.
+    """
+
+    def __init__(self, size: int, seed=PAYLOAD_SEED, compressibility=0.0, text=False, block_size=BLOCK_SIZE):
+        if not 0 <= compressibility <= 1:
+            raise ValueError(f"Compressibility must be between 0 and 1, got {compressibility}")
+        self.size = size
+        self.seed = seed
+        self.compressibility = compressibility
+        self.text = text
+        self.block_size = block_size
+        self._sha256 = None
+
+    def block(self, index: int) -> bytes:
+        length = min(self.block_size, self.size - index * self.block_size)
+        if length <= 0:
+            return b''
+        random_length = round(length * (1 - self.compressibility))
+        data = random.Random(f"{self.seed}:{index}").randbytes(random_length)
+        if self.text:
+            data = data.translate(TEXT_TABLE)
+        return data + (b'a' if self.text else b'\0') * (length - random_length)
+
+    def read(self, offset=0, length=None) -> bytes:
+        end = self.size if length is None else min(offset + length, self.size)
+        if offset >= end:
+            return b''
+        first, last = offset // self.block_size, (end - 1) // self.block_size
+        data = b''.join(self.block(index) for index in range(first, last + 1))
+        start = offset - first * self.block_size
+        return data[start:start + end - offset]
+
+    def chunks(self, chunk_size=None, offset=0, length=None):
+        chunk_size = chunk_size or self.block_size
+        end = self.size if length is None else min(offset + length, self.size)
+        if chunk_size == self.block_size and offset % self.block_size == 0:
+            for index in range(offset // self.block_size, (end + self.block_size - 1) // self.block_size):
+                yield self.block(index)[:end - index * self.block_size]
+            return
+        for position in range(offset, end, chunk_size):
+            yield self.read(position, min(chunk_size, end - position))
+
+    def bytes(self) -> bytes:
+        return b''.join(self.chunks())
+
+    def write(self, path: str) -> str:
+        # Writing to a temporary name first means a file with the final name is always complete
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            for chunk in self.chunks():
+                f.write(chunk)
+        os.replace(temp_path, path)
+        return path
+
+    def sha256(self) -> str:
+        if self._sha256 is None:
+            digest = hashlib.sha256()
+            for chunk in self.chunks():
+                digest.update(chunk)
+            self._sha256 = digest.hexdigest()
+        return self._sha256
+
+
+def file_sha256(path: str, chunk_size=BLOCK_SIZE) -> tuple:
+    # Reads the file in pieces so even huge downloads never have to fit in memory, returns (digest, size)
+    digest, size = hashlib.sha256(), 0
+    with open(path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def random_bytes(size: int, seed=PAYLOAD_SEED, compressibility=0.0) -> bytes:
+    return Payload(size, seed, compressibility).bytes()
+
+
+def random_text(size: int, seed=PAYLOAD_SEED, compressibility=0.0) -> str:
+    return Payload(size, seed, compressibility, text=True).bytes().decode('ascii')
+
+
+def payload_file(size: int, directory='/tmp/nextcloud_payloads', seed=PAYLOAD_SEED, compressibility=0.0, text=False) -> str:
+    # Files are named after everything that goes into them, so a cached file is reused only if the content matches
+    payload = Payload(size, seed, compressibility, text)
+    path = os.path.join(directory, f"payload-{size}-{seed}-{compressibility:g}{'-text' if text else ''}.{'txt' if text else 'bin'}")
+    if not os.path.exists(path) or os.path.getsize(path) != size:
+        payload.write(path)
+    return path
+
+
+SIZE_UNITS = {'': 1, 'B': 1, 'K': 1024, 'KB': 1024, 'M': 1024 ** 2, 'MB': 1024 ** 2, 'G': 1024 ** 3, 'GB': 1024 ** 3}
+
+def parse_size(size: str) -> int:
+    # "1K", "10MB", "2.5GiB" or plain bytes, units are binary
+    match = re.fullmatch(r'\s*([0-9.]+)\s*([KMG]?)I?B?\s*', size.upper())
+    if match is None:
+        raise ValueError(f"Invalid size: {size}")
+    return int(float(match[1]) * SIZE_UNITS[match[2]])
+
+
+def format_size(size: int) -> str:
+    for unit in ('G', 'M', 'K'):
+        if size >= SIZE_UNITS[unit] and size % SIZE_UNITS[unit] == 0:
+            return f"{size // SIZE_UNITS[unit]}{unit}"
+    return f"{size}B"
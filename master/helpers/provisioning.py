@@ -0,0 +1,118 @@
+import json
+import os
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers.dav_client import DavClient, DavError
+
+# Users and groups through the OCS Provisioning API, as admin. Everything here is idempotent, so scenarios can
+# call ensure_user() every run and bulk creation can be restarted after a failure.
+ADMIN_USER = os.environ.get('NC_ADMIN_USER', 'nextcloud')
+ADMIN_PASSWORD = os.environ.get('NC_ADMIN_PASSWORD', 'nextcloud')
+# Long enough for the default password policy
+DEFAULT_PASSWORD = os.environ.get('NC_PROVISION_PASSWORD', 'loadtest!Pass42')
+PROVISION_CONCURRENCY = int(os.environ.get('NC_PROVISION_CONCURRENCY', 8))
+
+# OCS status codes for "already exists" when creating and "does not exist" when deleting users and groups
+ALREADY_EXISTS = 102
+DOES_NOT_EXIST = 101
+
+
+def admin_client(domain: str, pool=None) -> DavClient:
+    return DavClient(domain, ADMIN_USER, ADMIN_PASSWORD, pool)
+
+
+def ocs_status(error: DavError):
+    # v2 endpoints map OCS failures to HTTP 400, the actual reason is only in the body
+    try:
+        return json.loads(error.body)['ocs']['meta']['statuscode']
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def user_exists(client: DavClient, username: str) -> bool:
+    try:
+        client.ocs('GET', f"cloud/users/{urllib.parse.quote(username)}", name='OCS get user')
+    except DavError as e:
+        if e.status == 404:
+            return False
+        raise
+    return True
+
+
+def create_user(client: DavClient, username: str, password=DEFAULT_PASSWORD, groups=(), display_name=None, email=None) -> bool:
+    # Returns False if the user existed already
+    params = {'userid': username, 'password': password, 'groups[]': list(groups)}
+    if display_name:
+        params['displayName'] = display_name
+    if email:
+        params['email'] = email
+    try:
+        client.ocs('POST', 'cloud/users', params, name='OCS create user')
+    except DavError as e:
+        if e.status == 400 and ocs_status(e) == ALREADY_EXISTS:
+            return False
+        raise
+    return True
+
+
+def ensure_user(client: DavClient, username: str, password=DEFAULT_PASSWORD, groups=(), display_name=None, email=None) -> bool:
+    # Only creates the user, an existing one keeps its password and groups. Returns True if it was created.
+    if user_exists(client, username):
+        return False
+    return create_user(client, username, password, groups, display_name, email)
+
+
+def missing(error: DavError) -> bool:
+    return error.status == 404 or (error.status == 400 and ocs_status(error) == DOES_NOT_EXIST)
+
+
+def delete_user(client: DavClient, username: str) -> bool:
+    # Returns False if there was no such user
+    try:
+        client.ocs('DELETE', f"cloud/users/{urllib.parse.quote(username)}", name='OCS delete user')
+    except DavError as e:
+        if missing(e):
+            return False
+        raise
+    return True
+
+
+def create_group(client: DavClient, group: str) -> bool:
+    try:
+        client.ocs('POST', 'cloud/groups', {'groupid': group}, name='OCS create group')
+    except DavError as e:
+        if e.status == 400 and ocs_status(e) == ALREADY_EXISTS:
+            return False
+        raise
+    return True
+
+
+def delete_group(client: DavClient, group: str) -> bool:
+    try:
+        client.ocs('DELETE', f"cloud/groups/{urllib.parse.quote(group)}", name='OCS delete group')
+    except DavError as e:
+        if missing(e):
+            return False
+        raise
+    return True
+
+
+def user_names(prefix: str, count: int) -> list:
+    return [f"{prefix}{i:05d}" for i in range(count)]
+
+
+def create_users(client: DavClient, usernames: list, password=DEFAULT_PASSWORD, groups=(), concurrency=PROVISION_CONCURRENCY) -> int:
+    # Groups first, users can only be put into existing groups. Returns how many users were new.
+    for group in groups:
+        create_group(client, group)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='provisioning') as executor:
+        return sum(executor.map(lambda username: create_user(client, username, password, groups), usernames))
+
+
+def delete_users(client: DavClient, usernames: list, groups=(), concurrency=PROVISION_CONCURRENCY) -> int:
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='provisioning') as executor:
+        deleted = sum(executor.map(lambda username: delete_user(client, username), usernames))
+    for group in groups:
+        delete_group(client, group)
+    return deleted
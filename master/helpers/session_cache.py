@@ -0,0 +1,81 @@
+import json
+import os
+import re
+
+from playwright.sync_api import BrowserContext, Page
+
+from helpers.helper_functions import log_note, login_nextcloud
+
+# Set NC_SESSION_CACHE=0 to always go through the login form, e.g. when the login itself is benchmarked
+SESSION_CACHE = os.environ.get('NC_SESSION_CACHE', '1') != '0'
+SESSION_DIR = os.environ.get('NC_SESSION_DIR', '/tmp/nextcloud_sessions')
+
+
+def session_file(username: str, domain: str) -> str:
+    name = re.sub(r'[^A-Za-z0-9._-]', '_', f"{domain}_{username}")
+    return os.path.join(SESSION_DIR, f"{name}.json")
+
+
+def new_session_context(pool, username='nextcloud', domain='https://ncs', **context_kwargs) -> BrowserContext:
+    path = session_file(username, domain)
+    if SESSION_CACHE and os.path.exists(path):
+        context_kwargs['storage_state'] = path
+    return pool.new_context(**context_kwargs)
+
+
+def write_session(state: dict, username: str, domain: str) -> None:
+    os.makedirs(SESSION_DIR, exist_ok=True)
+    path = session_file(username, domain)
+    # Write to a temp file first so parallel scenarios never read a half written state
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def forget_session(username: str, domain: str) -> None:
+    path = session_file(username, domain)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def login_cached(page: Page, username='nextcloud', password='nextcloud', domain='https://ncs') -> None:
+    if SESSION_CACHE:
+        page.goto(domain)
+        if '/login' not in page.url:
+            return
+        # One phase name for all users, so form logins end up in a single histogram
+        log_note(f"No valid session for {username}", kind='result')
+        log_note("Logging in through the login form")
+
+    login_nextcloud(page, username, password, domain)
+    page.wait_for_url(lambda url: '/login' not in url)
+
+    if SESSION_CACHE:
+        write_session(page.context.storage_state(), username, domain)
+
+
+async def new_session_context_async(pool, username='nextcloud', domain='https://ncs', **context_kwargs):
+    path = session_file(username, domain)
+    if SESSION_CACHE and os.path.exists(path):
+        context_kwargs['storage_state'] = path
+    return await pool.new_context(**context_kwargs)
+
+
+async def login_cached_async(page, username='nextcloud', password='nextcloud', domain='https://ncs') -> None:
+    if SESSION_CACHE:
+        await page.goto(domain)
+        if '/login' not in page.url:
+            return
+        # One phase name for all users, so form logins end up in a single histogram
+        log_note(f"No valid session for {username}", kind='result')
+        log_note("Logging in through the login form")
+
+    await page.goto(f"{domain}/login")
+    await page.locator('#user').fill(username)
+    await page.locator('#password').fill(password)
+    await page.locator('#password').press("Enter")
+    await page.wait_for_url(lambda url: '/login' not in url)
+
+    if SESSION_CACHE:
+        write_session(await page.context.storage_state(), username, domain)
@@ -0,0 +1,142 @@
+import base64
+import json
+import os
+import threading
+from time import perf_counter, sleep, time_ns
+
+from helpers import latency
+from helpers.dav_client import DavClient
+
+# Speaks the Text app's session protocol (create, push, sync, close) without a browser.
+# Steps are framed like y-protocol sync updates, but instead of a Yjs update they carry a marker with the editor,
+# a sequence number and the send time. The server relays steps without decoding them, which is all the load needs,
+# but a browser opening the same document could not apply them, so use a document of its own.
+TEXT_SESSION_URL = os.environ.get('NC_TEXT_SESSION_URL', '/apps/text/session')
+
+MESSAGE_SYNC = 0
+SYNC_UPDATE = 2
+MARKER_PREFIX = b'nc-runner:'
+
+
+def varuint(value: int) -> bytes:
+    encoded = bytearray()
+    while value > 0x7f:
+        encoded.append(0x80 | (value & 0x7f))
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def read_varuint(data: bytes, position: int) -> tuple:
+    value, shift = 0, 0
+    while True:
+        byte = data[position]
+        value |= (byte & 0x7f) << shift
+        position += 1
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def encode_step(payload: bytes) -> str:
+    return base64.b64encode(bytes([MESSAGE_SYNC, SYNC_UPDATE]) + varuint(len(payload)) + payload).decode()
+
+
+def decode_step(step: str):
+    # The payload of a sync update, None for anything else (e.g. steps of real editors that are not updates)
+    data = base64.b64decode(step)
+    if len(data) < 3 or data[0] != MESSAGE_SYNC or data[1] != SYNC_UPDATE:
+        return None
+    length, position = read_varuint(data, 2)
+    return data[position:position + length]
+
+
+def marker(editor: str, sequence: int) -> bytes:
+    return MARKER_PREFIX + f"{editor}:{sequence}:{time_ns()}".encode()
+
+
+def parse_marker(payload: bytes):
+    # (editor, sequence, sent time in ns) or None
+    if payload is None or not payload.startswith(MARKER_PREFIX):
+        return None
+    editor, sequence, sent_ns = payload[len(MARKER_PREFIX):].decode().rsplit(':', 2)
+    return editor, int(sequence), int(sent_ns)
+
+
+class TextLogin:
+    """Session cookie and CSRF token of one user, which the Text app's routes need besides basic auth."""
+
+    def __init__(self, client: DavClient):
+        self.client = client
+        _, headers, data = client.request('GET', '/index.php/csrftoken', expect=(200,), name='Text csrftoken')
+        self.token = json.loads(data)['token']
+        self.cookies = '; '.join(cookie.split(';', 1)[0] for cookie in headers.get_all('Set-Cookie') or [])
+
+    def send(self, method: str, path: str, body: dict, name: str):
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json', 'requesttoken': self.token, 'OCS-APIRequest': 'true'}
+        if self.cookies:
+            headers['Cookie'] = self.cookies
+        _, _, data = self.client.request(method, f"/index.php{TEXT_SESSION_URL}{path}", json.dumps(body).encode(), headers, expect=(200,), name=name)
+        return json.loads(data) if data else {}
+
+
+class TextEditor:
+    """One editing session on a document: pushes marker steps and picks up everybody else's."""
+
+    def __init__(self, login: TextLogin, file_id: int, name: str, scenario=None):
+        self.login = login
+        self.file_id = file_id
+        self.name = name
+        self.scenario = scenario or login.client.scenario
+        self.sequence = 0
+        self.received = 0
+        self.session = None
+
+    def open(self) -> None:
+        created = self.login.send('PUT', '/create', {'fileId': self.file_id}, 'Text session create')
+        self.document_id = created['document']['id']
+        self.version = created['document'].get('lastSavedVersion', 0)
+        self.session = created['session']
+
+    def body(self, **extra) -> dict:
+        return {'documentId': self.document_id, 'sessionId': self.session['id'], 'sessionToken': self.session['token'], 'version': self.version, **extra}
+
+    def push(self) -> None:
+        self.sequence += 1
+        response = self.login.send('POST', f"/{self.document_id}/push", self.body(steps=[encode_step(marker(self.name, self.sequence))], awareness=''), 'Text push')
+        # The server may answer a push with steps the editor has not seen yet, or with an empty list
+        if isinstance(response, dict):
+            self.receive(response.get('steps', []))
+
+    def sync(self) -> None:
+        self.receive(self.login.send('POST', f"/{self.document_id}/sync", self.body(), 'Text sync').get('steps', []))
+
+    def receive(self, steps: list) -> None:
+        now = time_ns()
+        for step in steps:
+            self.version = max(self.version, step.get('version', 0))
+            for data in step.get('data', []):
+                if (parsed := parse_marker(decode_step(data))) is not None and parsed[0] != self.name:
+                    self.received += 1
+                    latency.record(self.scenario, 'Text step propagation', (now - parsed[2]) // 1000)
+
+    def close(self) -> None:
+        if self.session is not None:
+            self.login.send('POST', f"/{self.document_id}/close", self.body(), 'Text session close')
+            self.session = None
+
+    def run(self, duration_sec: float, steps_per_sec: float, sync_interval_sec: float, stop: threading.Event) -> None:
+        # Types at a steady rate and polls in between, the way the editor does while somebody is typing
+        started = perf_counter()
+        next_push = started
+        while not stop.is_set() and perf_counter() - started < duration_sec:
+            if steps_per_sec and perf_counter() >= next_push:
+                self.push()
+                next_push += 1 / steps_per_sec
+            else:
+                self.sync()
+            sleep(max(min(next_push - perf_counter() if steps_per_sec else sync_interval_sec, sync_interval_sec), 0))
+
+
+def file_id(client: DavClient, path: str) -> int:
+    return int(client.propfind(path, properties=('oc:fileid',))[client.files_path(path)]['fileid'])
@@ -0,0 +1,137 @@
+import json
+import math
+import os
+import random
+import re
+
+# NC_THINK_TIME_MODEL is either a path to a JSON file, a JSON string or a shorthand like "lognormal:4,0.6".
+# The JSON maps regular expressions, matched against the action (by default the last log_note message), to a distribution:
+#   {
+#     "Logging in": {"distribution": "constant", "value": 2},
+#     "message": {"distribution": "exponential", "mean": 3, "max": 20},
+#     "event|contact": {"distribution": "lognormal", "median": 4, "sigma": 0.6},
+#     "default": {"distribution": "replay", "file": "/tmp/repo/think_times.txt"}
+#   }
+# The first matching expression wins, "default" is used when none matches.
+THINK_TIME_MODEL = os.environ.get('NC_THINK_TIME_MODEL')
+THINK_TIME_SEED = os.environ.get('NC_THINK_TIME_SEED', '0')
+
+
+class Distribution:
+    def __init__(self, spec: dict):
+        self.min = float(spec.get('min', 0))
+        self.max = float(spec['max']) if 'max' in spec else math.inf
+
+    def draw(self, rng: random.Random) -> float:
+        raise NotImplementedError
+
+    def sample(self, rng: random.Random) -> float:
+        return min(max(self.draw(rng), self.min), self.max)
+
+
+class Constant(Distribution):
+    def __init__(self, spec: dict):
+        super().__init__(spec)
+        self.value = float(spec['value'])
+
+    def draw(self, rng):
+        return self.value
+
+
+class Exponential(Distribution):
+    def __init__(self, spec: dict):
+        super().__init__(spec)
+        self.mean = float(spec['mean'])
+
+    def draw(self, rng):
+        return rng.expovariate(1 / self.mean)
+
+
+class LogNormal(Distribution):
+    def __init__(self, spec: dict):
+        super().__init__(spec)
+        self.mu = math.log(float(spec['median']))
+        self.sigma = float(spec['sigma'])
+
+    def draw(self, rng):
+        return rng.lognormvariate(self.mu, self.sigma)
+
+
+class Replay(Distribution):
+    """Replays recorded delays in order, one per line of the file, starting at a seeded offset."""
+
+    def __init__(self, spec: dict):
+        super().__init__(spec)
+        if 'values' in spec:
+            self.values = [float(value) for value in spec['values']]
+        else:
+            with open(spec['file'], encoding='utf-8') as f:
+                self.values = [float(line) for line in f if re.fullmatch(r'\s*[0-9.]+\s*', line)]
+        if not self.values:
+            raise ValueError("Replay think time needs at least one recorded delay")
+        self.position = None
+
+    def draw(self, rng):
+        if self.position is None:
+            self.position = rng.randrange(len(self.values))
+        value = self.values[self.position % len(self.values)]
+        self.position += 1
+        return value
+
+
+DISTRIBUTIONS = {
+    'constant': Constant,
+    'exponential': Exponential,
+    'lognormal': LogNormal,
+    'replay': Replay,
+}
+
+SHORTHAND_PARAMETERS = {
+    'constant': ['value'],
+    'exponential': ['mean'],
+    'lognormal': ['median', 'sigma'],
+}
+
+
+def parse_shorthand(model: str) -> dict:
+    name, _, parameters = model.partition(':')
+    spec = {'distribution': name}
+    if name == 'replay':
+        spec['file'] = parameters
+    else:
+        spec.update(zip(SHORTHAND_PARAMETERS[name], parameters.split(',')))
+    return {'default': spec}
+
+
+def load_model(model: str) -> dict:
+    if os.path.isfile(model):
+        with open(model, encoding='utf-8') as f:
+            return json.load(f)
+    if model.lstrip().startswith('{'):
+        return json.loads(model)
+    return parse_shorthand(model)
+
+
+class ThinkTimeModel:
+    def __init__(self, specs: dict, seed='0'):
+        self.seed = seed
+        self.distributions = [(re.compile(pattern), DISTRIBUTIONS[spec['distribution']](spec)) for pattern, spec in specs.items() if pattern != 'default']
+        self.default = DISTRIBUTIONS[specs['default']['distribution']](specs['default']) if 'default' in specs else None
+        self.rngs = {}
+
+    def rng(self, key: str) -> random.Random:
+        # One generator per distribution so the sequence of one action does not depend on how often others ran
+        if key not in self.rngs:
+            self.rngs[key] = random.Random(f"{self.seed}:{key}")
+        return self.rngs[key]
+
+    def sample(self, action: str, fallback: float) -> float:
+        for pattern, distribution in self.distributions:
+            if pattern.search(action):
+                return distribution.sample(self.rng(pattern.pattern))
+        if self.default is not None:
+            return self.default.sample(self.rng('default'))
+        return fallback
+
+
+model = ThinkTimeModel(load_model(THINK_TIME_MODEL), THINK_TIME_SEED) if THINK_TIME_MODEL else None
@@ -7,26 +7,21 @@ import os
 
 from playwright.sync_api import Playwright, sync_playwright, expect
 
-from helpers.helper_functions import log_note, get_random_text, login_nextcloud, close_modal, timeout_handler, user_sleep
+from helpers.browser_pool import get_pool, close_pools, parse_headless_flag
+from helpers.session_cache import new_session_context, login_cached
+from helpers.helper_functions import log_note, get_random_text, close_modal, timeout_handler, user_sleep
 
 DOMAIN = os.environ.get('HOST_URL', 'http://app')
 
 def run(playwright: Playwright, browser_name: str) -> None:
-    log_note(f"Launch browser {browser_name}")
-    if browser_name == "firefox":
-        browser = playwright.firefox.launch(headless=False)
-    else:
-        browser = playwright.chromium.launch(headless=False, args=['--disable-gpu', '--disable-software-rasterizer', '--ozone-platform=wayland'])
-    context = browser.new_context(ignore_https_errors=True)
+    pool = get_pool(playwright, browser_name)
+    context = new_session_context(pool, domain=DOMAIN)
     page = context.new_page()
 
     try:
-        log_note("Opening login page")
-        page.goto(f"{DOMAIN}/login")
-
         log_note("Logging in")
-        login_nextcloud(page, domain=DOMAIN)
-        user_sleep()
+        login_cached(page, domain=DOMAIN)
+        user_sleep(page=page)
 
         # Wait for the modal to load. As it seems you can't close it while it is showing the opening animation.
         log_note("Close first-time run popup")
@@ -34,7 +29,7 @@ def run(playwright: Playwright, browser_name: str) -> None:
 
         log_note("Going to calendar")
         page.get_by_role("link", name="Calendar", exact=True).click()
-        user_sleep()
+        user_sleep(page=page)
 
         #CREATE
         log_note("Create event")
@@ -42,13 +37,13 @@ def run(playwright: Playwright, browser_name: str) -> None:
         page.get_by_role("button", name="New event").click()
         page.get_by_placeholder("Event title").fill(event_name)
         page.get_by_role("button", name="Save").click()
-        user_sleep()
+        user_sleep(page=page, until=lambda: page.get_by_text(event_name, exact=True).wait_for())
 
         log_note("Checking if event was correctly saved")
         expect(page.get_by_text(event_name, exact=True)).to_be_visible()
         event_title_locator = page.locator(f'a.fc-event div.fc-event-title', has_text=event_name)
         expect(event_title_locator).to_have_count(1)
-        user_sleep()
+        user_sleep(page=page)
 
         # EDIT
         log_note("Modify event - Clicking edit form")
@@ -57,7 +52,7 @@ def run(playwright: Playwright, browser_name: str) -> None:
         expect(popover_locator).to_be_visible()
         edit_button = popover_locator.locator('button:has-text("Edit")')
         edit_button.click()
-        user_sleep()
+        user_sleep(page=page)
 
         log_note('Typing in new detail text')
         title_input = popover_locator.locator('input[placeholder="Event title"]')
@@ -68,13 +63,13 @@ def run(playwright: Playwright, browser_name: str) -> None:
 
         update_button = popover_locator.locator('button:has-text("Update")')
         update_button.click()
-        user_sleep()
+        user_sleep(page=page)
 
         log_note('Validating if new text was saved')
         updated_event_title_locator = page.locator(f'a.fc-event div.fc-event-title', has_text=new_event_name)
         expect(updated_event_title_locator).to_have_text(new_event_name)
         expect(updated_event_title_locator).to_have_count(1)
-        user_sleep()
+        user_sleep(page=page)
 
 
         # DELETE
@@ -88,7 +83,7 @@ def run(playwright: Playwright, browser_name: str) -> None:
         menu_selector = f'ul#{menu_id}[role="menu"]'
         menu_locator = page.locator(menu_selector)
         expect(menu_locator).to_be_visible()
-        user_sleep()
+        user_sleep(page=page)
 
         log_note("Delete the event - Clicking delete")
         delete_button = menu_locator.locator('button.action-button:has-text("Delete")')
@@ -97,14 +92,14 @@ def run(playwright: Playwright, browser_name: str) -> None:
 
         log_note('Validating event was deleted')
         expect(updated_event_title_locator).to_have_count(0)
-        user_sleep()
+        user_sleep(page=page)
 
         page.close()
         log_note("Close browser")
 
     except Exception as e:
         if hasattr(e, 'message'): # only Playwright error class has this member
-            log_note(f"Exception occurred: {e.message}")
+            log_note(f"Exception occurred: {e.message}", kind='result')
 
         # set a timeout. Since the call to page.content() is blocking we need to defer it to the OS
         signal.signal(signal.SIGALRM, timeout_handler)
@@ -115,11 +110,11 @@ def run(playwright: Playwright, browser_name: str) -> None:
         raise e
 
     # ---------------------
-    context.close()
-    browser.close()
+    pool.release(context)
 
 
 if __name__ == "__main__":
+    parse_headless_flag()
     if len(sys.argv) > 1:
         browser_name = sys.argv[1].lower()
         if browser_name not in ["chromium", "firefox"]:
@@ -130,3 +125,4 @@ if __name__ == "__main__":
 
     with sync_playwright() as playwright:
         run(playwright, browser_name)
+        close_pools()
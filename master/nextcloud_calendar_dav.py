@@ -0,0 +1,110 @@
+import os
+import random
+import string
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+
+from helpers.dav_client import ConnectionPool, DavClient, parse_users
+from helpers.event_log import events as event_log, labelled
+from helpers.helper_functions import log_note
+
+# Create -> find -> rename -> delete cycle of nextcloud_calendar.py over CalDAV, for many events and users at once
+DOMAIN = os.environ.get('HOST_URL', 'http://app')
+CALDAV_USERS = parse_users(os.environ.get('CALDAV_USERS', 'nextcloud'), os.environ.get('DAV_PASSWORD', 'nextcloud'))
+CALDAV_CALENDAR = os.environ.get('CALDAV_CALENDAR', 'personal')
+CALDAV_WORKERS = int(os.environ.get('CALDAV_WORKERS', 8))
+CALDAV_EVENTS = int(os.environ.get('CALDAV_EVENTS', 50)) # per worker
+
+EVENT = """BEGIN:VCALENDAR\r
+VERSION:2.0\r
+PRODID:-//Green Coding Solutions//nextcloud-runner//EN\r
+BEGIN:VEVENT\r
+UID:{uid}\r
+DTSTAMP:{stamp}\r
+DTSTART:{start}\r
+DTEND:{end}\r
+SUMMARY:{summary}\r
+END:VEVENT\r
+END:VCALENDAR\r
+"""
+
+TIME_RANGE_QUERY = """<?xml version="1.0" encoding="utf-8"?>
+<cal:calendar-query xmlns:d="DAV:" xmlns:cal="urn:ietf:params:xml:ns:caldav">
+  <d:prop><d:getetag/></d:prop>
+  <cal:filter><cal:comp-filter name="VCALENDAR"><cal:comp-filter name="VEVENT">
+    <cal:time-range start="{start}" end="{end}"/>
+  </cal:comp-filter></cal:comp-filter></cal:filter>
+</cal:calendar-query>"""
+
+def ical_time(time: datetime) -> str:
+    return time.strftime('%Y%m%dT%H%M%SZ')
+
+def event(uid: str, start: datetime, summary: str) -> bytes:
+    return EVENT.format(uid=uid, stamp=ical_time(datetime.now(timezone.utc)), start=ical_time(start), end=ical_time(start + timedelta(hours=1)), summary=summary).encode()
+
+def cycle(client: DavClient, uid: str, start: datetime) -> None:
+    path = client.dav_path('calendars', f"{CALDAV_CALENDAR}/{uid}.ics")
+
+    etag = client.put_object(path, event(uid, start, f"Event {uid}"), 'text/calendar; charset=utf-8', name='CalDAV PUT create')
+
+    # The day view of a client: everything in the 24 hours around the event
+    day = start.replace(hour=0, minute=0, second=0)
+    found = client.report(client.dav_path('calendars', CALDAV_CALENDAR), TIME_RANGE_QUERY.format(start=ical_time(day), end=ical_time(day + timedelta(days=1))), name='CalDAV REPORT time-range')
+    if path not in found:
+        raise ValueError(f"Event {uid} is missing from the calendar query of its day")
+    etag = etag or found[path].get('getetag')
+
+    etag = client.put_object(path, event(uid, start, f"Event {uid} renamed"), 'text/calendar; charset=utf-8', etag, name='CalDAV PUT update')
+
+    client.delete_object(path, etag, name='CalDAV DELETE')
+
+def worker(client: DavClient, worker_id: int, events: int) -> None:
+    suffix = ''.join(random.choices(string.ascii_lowercase, k=5))
+    # Spread the events over the next weeks, so the queries do not all hit the same day
+    first = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    for i in range(events):
+        cycle(client, f"caldav-load-{suffix}-{worker_id}-{i}", first + timedelta(hours=7 * i + worker_id))
+
+def run(domain=DOMAIN, users=CALDAV_USERS, workers=CALDAV_WORKERS, events=CALDAV_EVENTS) -> None:
+    # One pool for all users, connections carry no state besides the authorization header of each request
+    pool = ConnectionPool(domain)
+    clients = [DavClient(domain, username, password, pool) for username, password in users]
+
+    try:
+        log_note(f"Start CalDAV load: {workers} workers for {len(clients)} users, {events} events each")
+        started = perf_counter()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='caldav-worker') as executor:
+            futures = []
+            for worker_id in range(workers):
+                client = clients[worker_id % len(clients)]
+                futures.append(executor.submit(labelled(worker, user=client.username), client, worker_id, events))
+            for future in futures:
+                future.result()
+        seconds = perf_counter() - started
+
+        # Every cycle is four requests: create, query, update and delete
+        requests = workers * events * 4
+        log_note(f"CalDAV load done: {requests} requests in {seconds:.1f}s ({requests / seconds:.1f} requests/s, {pool.opened} connections)", kind='result')
+
+    except Exception as e:
+        if hasattr(e, 'message'):
+            log_note(f"Exception occurred: {e.message}", kind='result')
+        raise e
+
+    finally:
+        # The last phase ends with the work, not when the interpreter exits
+        event_log.end_phase()
+        pool.close()
+
+
+if __name__ == "__main__":
+    # With --stub the cycle runs against an in memory server instead of HOST_URL
+    if '--stub' in sys.argv:
+        from helpers.dav_stub import start_stub_server
+        server = start_stub_server()
+        run(server.url)
+        server.shutdown()
+    else:
+        run()
@@ -0,0 +1,101 @@
+import os
+import random
+import string
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from helpers.dav_client import DavClient
+from helpers.event_log import events
+from helpers.helper_functions import log_note
+
+# Bulk version of nextcloud_contacts.py over CardDAV: create, sync, update, sync, delete, sync, the way a phone
+# or Thunderbird keeps a large address book in sync
+DOMAIN = os.environ.get('HOST_URL', 'http://app')
+DAV_USER = os.environ.get('DAV_USER', 'nextcloud')
+DAV_PASSWORD = os.environ.get('DAV_PASSWORD', 'nextcloud')
+CARDDAV_ADDRESSBOOK = os.environ.get('CARDDAV_ADDRESSBOOK', 'contacts')
+CARDDAV_CONTACTS = int(os.environ.get('CARDDAV_CONTACTS', 1000))
+CARDDAV_WORKERS = int(os.environ.get('CARDDAV_WORKERS', 8))
+
+VCARD = """BEGIN:VCARD\r
+VERSION:3.0\r
+PRODID:-//Green Coding Solutions//nextcloud-runner//EN\r
+UID:{uid}\r
+FN:Gary McKinnon {number}\r
+N:McKinnon {number};Gary;;;\r
+EMAIL;TYPE=INTERNET:{uid}@example.com\r
+TEL;TYPE=CELL:+49 30 {number:07d}\r
+NOTE:{note}\r
+END:VCARD\r
+"""
+
+def vcard(uid: str, number: int, note='') -> bytes:
+    return VCARD.format(uid=uid, number=number, note=note).encode()
+
+def sync(client: DavClient, token: str, expected_changed: int, expected_removed: int) -> tuple:
+    token, changed, removed = client.sync_collection(client.addressbook_path(CARDDAV_ADDRESSBOOK), token, name='CardDAV sync-collection')
+    # Other clients may change the address book at the same time, so more changes are fine
+    if len(changed) < expected_changed or len(removed) < expected_removed:
+        raise ValueError(f"Sync returned {len(changed)} changed and {len(removed)} removed contacts, expected {expected_changed} and {expected_removed}")
+    log_note(f"Sync returned {len(changed)} changed and {len(removed)} removed contacts", kind='result')
+    return token, changed
+
+def run(domain=DOMAIN, contacts=CARDDAV_CONTACTS, workers=CARDDAV_WORKERS) -> None:
+    client = DavClient(domain, DAV_USER, DAV_PASSWORD)
+    suffix = ''.join(random.choices(string.ascii_lowercase, k=5))
+    uids = [f"carddav-load-{suffix}-{i}" for i in range(contacts)]
+    paths = [client.addressbook_path(CARDDAV_ADDRESSBOOK, f"{uid}.vcf") for uid in uids]
+    etags = [None] * contacts
+
+    def create(i):
+        etags[i] = client.put_object(paths[i], vcard(uids[i], i), 'text/vcard; charset=utf-8', name='CardDAV PUT create')
+
+    def update(i):
+        etags[i] = client.put_object(paths[i], vcard(uids[i], i, 'Updated'), 'text/vcard; charset=utf-8', etags[i], name='CardDAV PUT update')
+
+    def delete(i):
+        client.delete_object(paths[i], etags[i], name='CardDAV DELETE')
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='carddav-worker') as executor:
+            log_note("Initial sync")
+            token, _ = sync(client, '', 0, 0)
+
+            for action, operation, expected_changed, expected_removed in [
+                ('Create', create, contacts, 0),
+                ('Update', update, contacts, 0),
+                ('Delete', delete, 0, contacts),
+            ]:
+                log_note(f"{action} {contacts} contacts")
+                started = perf_counter()
+                list(executor.map(operation, range(contacts)))
+                seconds = perf_counter() - started
+                log_note(f"{action}d {contacts} contacts in {seconds:.1f}s ({contacts / seconds:.1f} contacts/s)", kind='result')
+
+                log_note(f"Sync after {action.lower()}")
+                token, changed = sync(client, token, expected_changed, expected_removed)
+                # Sabre leaves out the ETag when it stored the vCard modified, the sync has the one to send next
+                for i, path in enumerate(paths):
+                    etags[i] = etags[i] or changed.get(path, {}).get('getetag')
+
+    except Exception as e:
+        if hasattr(e, 'message'):
+            log_note(f"Exception occurred: {e.message}", kind='result')
+        raise e
+
+    finally:
+        # The last phase ends with the work, not when the interpreter exits
+        events.end_phase()
+        client.pool.close()
+
+
+if __name__ == "__main__":
+    # With --stub the contacts go to an in memory server instead of HOST_URL
+    if '--stub' in sys.argv:
+        from helpers.dav_stub import start_stub_server
+        server = start_stub_server()
+        run(server.url)
+        server.shutdown()
+    else:
+        run()
@@ -6,36 +6,39 @@ import os
 
 from playwright.sync_api import Playwright, sync_playwright, expect
 
-from helpers.helper_functions import log_note, get_random_text, login_nextcloud, close_modal, timeout_handler, user_sleep
+from helpers.browser_pool import get_pool, close_pools, parse_headless_flag
+from helpers.session_cache import new_session_context, login_cached
+from helpers.helper_functions import log_note, get_random_text, close_modal, timeout_handler, user_sleep
+from helpers.fixtures import fixtures, HYBRID
+from nextcloud_login import seed_sessions
 
 DOMAIN = os.environ.get('HOST_URL', 'http://app')
 
 TYPING_DELAY_MS = 100
+POOL_OPTIONS = {'window_size': (1280, 720)}
 
-def collaborate(playwright: Playwright, browser_name: str) -> None:
-    log_note(f"Launch two {browser_name} browsers")
-    if browser_name == "firefox":
-        browser = playwright.firefox.launch(headless=False, args=['-width', '1280', '-height', '720'])
-    else:
-        browser = playwright.chromium.launch(headless=False, args=['--disable-gpu', '--disable-software-rasterizer', '--ozone-platform=wayland', '--window-size=1280,720'])
+# In hybrid mode these replace the create user, create and share document and delete user steps
+DOCS_FIXTURES = {
+    'users': [{'username': 'docs_dude', 'password': 'docsrule!12', 'email': 'docs_dude@local.host'}],
+    'files': [{'path': 'Collaborative_doc_{suffix}.md', 'content': ''}],
+    'shares': [{'path': 'Collaborative_doc_{suffix}.md', 'share_with': 'docs_dude'}],
+}
 
-    context = browser.new_context(ignore_https_errors=True, viewport={'width': 1280, 'height': 720})
+def collaborate(playwright: Playwright, browser_name: str) -> None:
+    # Both users get their own isolated context in the same browser
+    pool = get_pool(playwright, browser_name, **POOL_OPTIONS)
+    context = new_session_context(pool, 'nextcloud', DOMAIN, viewport={'width': 1280, 'height': 720})
     admin_user_page = context.new_page()
 
-
-    if browser_name == "firefox":
-        browser_two = playwright.firefox.launch(headless=False, args=['-width', '1280', '-height', '720'])
-    else:
-        browser_two = playwright.chromium.launch(headless=False, args=['--disable-gpu', '--disable-software-rasterizer', '--ozone-platform=wayland', '--window-size=1280,720'])
-    context_two = browser_two.new_context(ignore_https_errors=True, viewport={'width': 1280, 'height': 720})
+    context_two = new_session_context(pool, 'docs_dude', DOMAIN, viewport={'width': 1280, 'height': 720})
     docs_user_page = context_two.new_page()
 
     try:
         # Login and open the file for both users
         log_note("Logging in with all users")
-        login_nextcloud(admin_user_page, "nextcloud", "nextcloud", DOMAIN)
-        login_nextcloud(docs_user_page, "docs_dude", "docsrule!12", DOMAIN)
-        user_sleep()
+        login_cached(admin_user_page, "nextcloud", "nextcloud", DOMAIN)
+        login_cached(docs_user_page, "docs_dude", "docsrule!12", DOMAIN)
+        user_sleep(page=[admin_user_page, docs_user_page])
 
         # Wait for the modal to load. As it seems you can't close it while it is showing the opening animation.
         log_note("Close first-time run popup")
@@ -49,7 +52,7 @@ def collaborate(playwright: Playwright, browser_name: str) -> None:
 
         admin_user_page.get_by_role("link", name="Shares", exact=True).click()
         docs_user_page.get_by_role("link", name="Shares", exact=True).click()
-        user_sleep()
+        user_sleep(page=[admin_user_page, docs_user_page])
 
         log_note('Selecting shared document with all users')
         sort_button = admin_user_page.locator('button.files-list__column-sort-button:has-text("Modified")')
@@ -77,7 +80,7 @@ def collaborate(playwright: Playwright, browser_name: str) -> None:
 
         admin_user_page.locator(f'tr[data-cy-files-list-row-name="{filename}"]').click()
         docs_user_page.locator(f'tr[data-cy-files-list-row-name="{filename}"]').click()
-        user_sleep()
+        user_sleep(page=[admin_user_page, docs_user_page])
 
         log_note("Starting to collaborate")
         # Write the first message and assert it's visible for the other user
@@ -92,13 +95,13 @@ def collaborate(playwright: Playwright, browser_name: str) -> None:
 
         log_note("Admin validation message")
         admin_user_page.keyboard.type(first_message, delay=TYPING_DELAY_MS)
-        user_sleep()
+        user_sleep(page=[admin_user_page, docs_user_page])
         log_note('Checking if message is visible')
         expect(docs_user_page.get_by_text(first_message)).to_be_visible()
 
         log_note("User validation message")
         docs_user_page.keyboard.type(first_message + '2', delay=TYPING_DELAY_MS)
-        user_sleep()
+        user_sleep(page=[admin_user_page, docs_user_page])
         expect(admin_user_page.get_by_text(first_message+ '2')).to_be_visible(timeout=15_000)
 
 
@@ -115,27 +118,33 @@ def collaborate(playwright: Playwright, browser_name: str) -> None:
                 docs_user_page.keyboard.type(random_message, delay=TYPING_DELAY_MS)
                 expect(admin_user_page.get_by_text(random_message)).to_be_visible(timeout=15_000)
 
-            user_sleep()
+            user_sleep(page=[admin_user_page, docs_user_page])
 
         log_note("Closing browsers")
         # ---------------------
         admin_user_page.close()
         docs_user_page.close()
-        context.close()
-        context_two.close()
-        browser.close()
-        browser_two.close()
+        pool.release(context)
+        pool.release(context_two)
 
     except Exception as e:
         if hasattr(e, 'message'): # only Playwright error class has this member
-            log_note(f"Exception occurred: {e.message}")
+            log_note(f"Exception occurred: {e.message}", kind='result')
         #log_note(f"Page content was: {docs_user_page.content()}")
         #log_note(f"Page content was: {admin_user_page.content()}")
         raise e
 
 
 
-with sync_playwright() as playwright:
+def collaborate_hybrid(playwright: Playwright, browser_name: str) -> None:
+    # The user, document and share come from the API, only the editing runs in the browser
+    with fixtures(DOMAIN, DOCS_FIXTURES):
+        seed_sessions(playwright, browser_name, [(user['username'], user['password']) for user in DOCS_FIXTURES['users']])
+        collaborate(playwright, browser_name)
+
+
+if __name__ == "__main__":
+    parse_headless_flag()
     if len(sys.argv) > 1:
         browser_name = sys.argv[1].lower()
         if browser_name not in ["chromium", "firefox"]:
@@ -144,4 +153,9 @@ with sync_playwright() as playwright:
     else:
         browser_name = "firefox"
 
-    collaborate(playwright, browser_name)
+    with sync_playwright() as playwright:
+        if HYBRID:
+            collaborate_hybrid(playwright, browser_name)
+        else:
+            collaborate(playwright, browser_name)
+        close_pools()
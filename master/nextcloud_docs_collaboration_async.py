@@ -0,0 +1,116 @@
+import asyncio
+import sys
+import os
+
+from playwright.async_api import async_playwright, expect
+
+from helpers.async_browser_pool import AsyncBrowserPool, open_concurrently
+from helpers.browser_pool import parse_headless_flag
+from helpers.session_cache import new_session_context_async, login_cached_async
+from helpers.helper_functions import log_note, get_random_text, user_sleep_async
+
+DOMAIN = os.environ.get('HOST_URL', 'http://app')
+
+TYPING_DELAY_MS = 100
+ROUNDS = 3
+
+USERS = [
+    ("nextcloud", "nextcloud"),
+    ("docs_dude", "docsrule!12"),
+]
+
+# Same flow as nextcloud_docs_collaboration.py, but all users type at the same time
+# and check for each other's text concurrently instead of taking turns.
+
+async def open_shares(pool: AsyncBrowserPool, username: str, password: str):
+    context = await new_session_context_async(pool, username, DOMAIN, viewport={'width': 1280, 'height': 720})
+    try:
+        page = await context.new_page()
+        await login_cached_async(page, username, password, DOMAIN)
+        await page.get_by_role("link", name="Files").click()
+        await page.get_by_role("link", name="Shares", exact=True).click()
+    except BaseException:
+        await pool.release(context)
+        raise
+    return context, page
+
+async def find_shared_document(page) -> str:
+    sort_button = page.locator('button.files-list__column-sort-button:has-text("Modified")')
+    if await sort_button.locator('.menu-up-icon').count() > 0:
+        log_note("The arrow is already pointing up. No need to click the button.")
+    else:
+        await sort_button.click()
+
+    tbody = page.locator("tbody.files-list__tbody")
+    await tbody.wait_for()
+
+    first_md_row = tbody.locator('tr[data-cy-files-list-row]').filter(
+        has=page.locator('.files-list__row-name-ext', has_text='.md')
+    ).first
+    await first_md_row.wait_for()
+
+    base = (await first_md_row.locator('.files-list__row-name-').inner_text()).strip()
+    ext = (await first_md_row.locator('.files-list__row-name-ext').inner_text()).strip()
+    return f"{base}{ext}"
+
+async def open_document(page, filename: str) -> None:
+    await page.locator(f'tr[data-cy-files-list-row-name="{filename}"]').click()
+    await page.locator('div[contenteditable="true"]').first.wait_for(state="visible")
+
+async def type_and_check(pages, messages) -> None:
+    await asyncio.gather(*[page.keyboard.type(message, delay=TYPING_DELAY_MS) for page, message in zip(pages, messages)])
+    await asyncio.gather(*[
+        expect(receiver.get_by_text(message)).to_be_visible(timeout=15_000)
+        for i, message in enumerate(messages)
+        for receiver in pages[:i] + pages[i + 1:]
+    ])
+
+async def collaborate(browser_name: str) -> None:
+    async with async_playwright() as playwright:
+        pool = AsyncBrowserPool(playwright, browser_name, window_size=(1280, 720))
+
+        try:
+            log_note("Logging in and opening shares menu with all users")
+            sessions = await open_concurrently(pool, [open_shares(pool, username, password) for username, password in USERS])
+            pages = [page for _, page in sessions]
+            await user_sleep_async(page=pages)
+
+            log_note('Selecting shared document with all users')
+            filename = await find_shared_document(pages[0])
+            print("Selected filename:", filename)
+            await asyncio.gather(*[open_document(page, filename) for page in pages])
+            await user_sleep_async(page=pages)
+
+            log_note("Starting to collaborate")
+            log_note("All users sending validation message")
+            await type_and_check(pages, [f"FIRST_VALIDATION_MESSAGE{i}" for i in range(len(pages))])
+            await user_sleep_async(page=pages)
+
+            for _ in range(ROUNDS):
+                log_note("All users adding more text")
+                await type_and_check(pages, [get_random_text(50) for _ in pages])
+                await user_sleep_async(page=pages)
+
+        except Exception as e:
+            if hasattr(e, 'message'): # only Playwright error class has this member
+                log_note(f"Exception occurred: {e.message}", kind='result')
+            raise e
+
+        finally:
+            log_note("Closing browsers")
+            # ---------------------
+            # Closing the pool releases every context it still has, also when joining failed halfway
+            await pool.close()
+
+
+if __name__ == "__main__":
+    parse_headless_flag()
+    if len(sys.argv) > 1:
+        browser_name = sys.argv[1].lower()
+        if browser_name not in ["chromium", "firefox"]:
+            print("Invalid browser name. Please choose either 'chromium' or 'firefox'.")
+            sys.exit(1)
+    else:
+        browser_name = "firefox"
+
+    asyncio.run(collaborate(browser_name))
@@ -8,27 +8,22 @@ import signal
 
 from playwright.sync_api import Playwright, sync_playwright
 
-from helpers.helper_functions import log_note, get_random_text, login_nextcloud, close_modal, timeout_handler, user_sleep
+from helpers.browser_pool import get_pool, close_pools, parse_headless_flag
+from helpers.session_cache import new_session_context, login_cached
+from helpers.helper_functions import log_note, get_random_text, close_modal, timeout_handler, user_sleep
 
 
 DOMAIN = os.environ.get('HOST_URL', 'http://app')
 
 
 def run(playwright: Playwright, browser_name: str) -> None:
-    log_note(f"Launch browser {browser_name}")
-    if browser_name == "firefox":
-        browser = playwright.firefox.launch(headless=False)
-    else:
-        browser = playwright.chromium.launch(headless=False, args=['--disable-gpu', '--disable-software-rasterizer', '--ozone-platform=wayland'])
-    context = browser.new_context(ignore_https_errors=True)
+    pool = get_pool(playwright, browser_name)
+    context = new_session_context(pool, domain=DOMAIN)
     page = context.new_page()
     try:
-        log_note("Opening login page")
-        page.goto(f"{DOMAIN}/login")
-
         log_note("Logging in")
-        login_nextcloud(page, domain=DOMAIN)
-        user_sleep()
+        login_cached(page, domain=DOMAIN)
+        user_sleep(page=page)
 
         # Wait for the modal to load. As it seems you can't close it while it is showing the opening animation.
         log_note("Close first-time run popup")
@@ -43,7 +38,7 @@ def run(playwright: Playwright, browser_name: str) -> None:
         file_name = f'Collaborative_doc_{rand_str}.md'
         page.get_by_label('Filename', exact=True).fill(file_name)
         page.locator('.dialog__actions').get_by_role("button", name="Create").click()
-        user_sleep()
+        user_sleep(page=page, until=lambda: page.locator('div[contenteditable="true"]').first.wait_for())
 
         # log_note("Share file with other user - Open context menu")
         # modal_header = page.get_by_role("heading", name=re.compile(rf"\b{re.escape(file_name)}\b"))
@@ -56,24 +51,23 @@ def run(playwright: Playwright, browser_name: str) -> None:
         page.locator('div.header-actions button[aria-label="Actions"].action-item__menutoggle').click()
         page.get_by_role("menuitem", name="Open sidebar").click()
         page.get_by_role("tab", name="Sharing").click()
-        user_sleep()
+        user_sleep(page=page)
 
         log_note('Sharing with docs_dude user')
         page.get_by_placeholder("Type names or teams").fill("docs")
         page.get_by_text("docs_dude").first.click()
         page.get_by_text("Save Share").first.click()
-        user_sleep()
+        user_sleep(page=page)
 
 
         log_note("Close browser")
         page.close()
 
         # ---------------------
-        context.close()
-        browser.close()
+        pool.release(context)
     except Exception as e:
         if hasattr(e, 'message'): # only Playwright error class has this member
-            log_note(f"Exception occurred: {e.message}")
+            log_note(f"Exception occurred: {e.message}", kind='result')
 
         # set a timeout. Since the call to page.content() is blocking we need to defer it to the OS
         signal.signal(signal.SIGALRM, timeout_handler)
@@ -84,7 +78,8 @@ def run(playwright: Playwright, browser_name: str) -> None:
         raise e
 
 
-with sync_playwright() as playwright:
+if __name__ == "__main__":
+    parse_headless_flag()
     if len(sys.argv) > 1:
         browser_name = sys.argv[1].lower()
         if browser_name not in ["chromium", "firefox"]:
@@ -93,4 +88,6 @@ with sync_playwright() as playwright:
     else:
         browser_name = "firefox"
 
-    run(playwright, browser_name)
+    with sync_playwright() as playwright:
+        run(playwright, browser_name)
+        close_pools()
@@ -0,0 +1,98 @@
+import os
+import random
+import string
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers.dav_client import DavClient
+from helpers.event_log import events, labelled
+from helpers.helper_functions import log_note
+from helpers.text_sync import TextEditor, TextLogin, file_id
+from helpers import latency
+
+# Many people typing into one document, like nextcloud_docs_collaboration.py but through the Text app's session
+# API without browsers. Every editor pushes TEXT_STEPS_PER_SEC steps and polls for the others' in between, the
+# time from a push until another editor's sync returns it is recorded as "Text step propagation".
+DOMAIN = os.environ.get('HOST_URL', 'http://app')
+DAV_USER = os.environ.get('DAV_USER', 'nextcloud')
+DAV_PASSWORD = os.environ.get('DAV_PASSWORD', 'nextcloud')
+TEXT_EDITORS = int(os.environ.get('TEXT_EDITORS', 20))
+TEXT_STEPS_PER_SEC = float(os.environ.get('TEXT_STEPS_PER_SEC', 2))
+TEXT_SYNC_INTERVAL_SEC = float(os.environ.get('TEXT_SYNC_INTERVAL_SEC', 0.3))
+TEXT_DURATION_SEC = float(os.environ.get('TEXT_DURATION_SEC', 60))
+
+
+def run(domain=DOMAIN, editors=TEXT_EDITORS, steps_per_sec=TEXT_STEPS_PER_SEC, duration=TEXT_DURATION_SEC) -> dict:
+    client = DavClient(domain, DAV_USER, DAV_PASSWORD)
+    # A document of its own, the marker steps are nothing a browser could render
+    document = 'Editors_doc_' + ''.join(random.choices(string.ascii_letters, k=5)) + '.md'
+    stop = threading.Event()
+
+    try:
+        log_note("Create document")
+        client.upload(document, b'# Editors load test\n')
+        login = TextLogin(client)
+        document_id = file_id(client, document)
+        sessions = [TextEditor(login, document_id, f"editor-{i}") for i in range(editors)]
+
+        log_note(f"Open {editors} editing sessions")
+        with ThreadPoolExecutor(max_workers=editors, thread_name_prefix='text-editor') as executor:
+            list(executor.map(TextEditor.open, sessions))
+
+            log_note(f"Type for {duration:.0f}s with {editors} editors at {steps_per_sec} steps/s each")
+            futures = [executor.submit(labelled(editor.run, user=editor.name), duration, steps_per_sec, TEXT_SYNC_INTERVAL_SEC, stop) for editor in sessions]
+            try:
+                for future in futures:
+                    future.result()
+            finally:
+                stop.set()
+
+            # A last sync picks up what was pushed after an editor's final poll
+            list(executor.map(TextEditor.sync, sessions))
+
+            log_note("Close editing sessions")
+            list(executor.map(TextEditor.close, sessions))
+
+        pushed = sum(editor.sequence for editor in sessions)
+        received = sum(editor.received for editor in sessions)
+        expected = pushed * (editors - 1)
+        summary = latency.histograms[client.scenario]['Text step propagation'].summary()
+        result = {
+            'editors': editors,
+            'steps_pushed': pushed,
+            'steps_received': received,
+            'steps_expected': expected,
+            'propagation_p50_ms': summary['p50'] / 1000,
+            'propagation_p99_ms': summary['p99'] / 1000,
+        }
+        log_note(
+            f"{editors} editors pushed {pushed} steps, {received} of {expected} arrived at the other editors, "
+            f"propagation p50 {result['propagation_p50_ms']:.1f}ms p99 {result['propagation_p99_ms']:.1f}ms", kind='result')
+
+        log_note("Delete document")
+        client.delete(document)
+
+    except Exception as e:
+        stop.set()
+        if hasattr(e, 'message'):
+            log_note(f"Exception occurred: {e.message}", kind='result')
+        raise e
+
+    finally:
+        # The last phase ends with the work, not when the interpreter exits
+        events.end_phase()
+        client.pool.close()
+
+    return result
+
+
+if __name__ == "__main__":
+    # With --stub the editors work on an in memory server instead of HOST_URL
+    if '--stub' in sys.argv:
+        from helpers.dav_stub import start_stub_server
+        server = start_stub_server()
+        run(server.url)
+        server.shutdown()
+    else:
+        run()
@@ -6,34 +6,53 @@ import signal
 import random
 import string
 
-from playwright.sync_api import Playwright, sync_playwright, expect
+from playwright.sync_api import Playwright, FileChooser, sync_playwright, expect
 
-from helpers.helper_functions import log_note, get_random_text, login_nextcloud, close_modal, timeout_handler, user_sleep
+from helpers.browser_pool import BrowserPool, get_pool, close_pools, parse_headless_flag
+from helpers.session_cache import new_session_context, login_cached
+from helpers.event_log import events
+from helpers.helper_functions import log_note, get_random_text, close_modal, timeout_handler, user_sleep
+from helpers.payload import Payload, payload_file, file_sha256, parse_size, format_size
 
 DOMAIN = os.environ.get('HOST_URL', 'http://app')
 
-FILE_PATH = '/tmp/repo/1mb.txt'
+# The uploaded file is generated, FILES_UPLOAD_COMPRESSIBILITY is the share of it that is a repeated filler
+FILE_SIZE = int(os.environ.get('FILES_UPLOAD_SIZE', 1024 * 1024))
+FILE_COMPRESSIBILITY = float(os.environ.get('FILES_UPLOAD_COMPRESSIBILITY', 0))
 
-def download(playwright: Playwright, browser_name: str, download_url:str) -> None:
-    log_note(f"Launch download browser {browser_name}")
+# With e.g. FILES_UPLOAD_SIZES=1K,1M,10M,100M,1G the script uploads one file of every size instead of running the normal flow
+UPLOAD_SIZES = [parse_size(size) for size in os.environ.get('FILES_UPLOAD_SIZES', '').split(',') if size.strip()]
+# Waiting for large uploads assumes at least this throughput before giving up
+UPLOAD_MIN_BYTES_PER_SEC = 1024 * 1024
 
-    download_path = os.path.join(os.getcwd(), 'downloads')
-    os.makedirs(download_path, exist_ok=True)
+def open_file_chooser(page) -> FileChooser:
+    page.get_by_role("button", name="New").click()
+    user_sleep(page=page)
 
-    if browser_name == "firefox":
-        browser = playwright.firefox.launch(headless=False, downloads_path=download_path)
-    else:
-        browser = playwright.chromium.launch(headless=False, downloads_path=download_path, args=['--disable-gpu', '--disable-software-rasterizer', '--ozone-platform=wayland'])
+    div_selector = 'div.v-popper__wrapper:has(ul[role="menu"])'
+    page.wait_for_selector(div_selector, state='visible')
+
+    with page.expect_file_chooser() as fc_info:
+        page.locator(f'{div_selector} button:has-text("Upload files")').click()
+
+    return fc_info.value
 
+def delete_file(page, file_name: str) -> None:
+    page.locator(f'tr[data-cy-files-list-row-name="{file_name}"] button[aria-label="Actions"]').click()
+    page.locator(f'li[data-cy-files-list-row-action="delete"] button').click()
 
-    context = browser.new_context(accept_downloads=True, ignore_https_errors=True)
+def download(pool: BrowserPool, download_url:str, expected_sha256=None) -> None:
+    # A fresh context of the already running browser is enough to open the share link anonymously
+    log_note("Open anonymous download context")
+
+    context = pool.new_context(accept_downloads=True)
     page = context.new_page()
 
     try:
 
         log_note('Opening shared link')
         page.goto(download_url)
-        user_sleep()
+        user_sleep(page=page)
 
         log_note('Clicking download link')
 
@@ -48,27 +67,23 @@ def download(playwright: Playwright, browser_name: str, download_url:str) -> Non
 
         download = download_info.value
 
-        download_file_name = download_path + '/' + download.suggested_filename
-        download.save_as(download_file_name)
-
-        if os.path.exists(download_file_name):
-            if download_file_name_size := os.path.getsize(download_file_name) >= (1 * 1024 * 1024 - 16): # We substract 16 to avoid one off errors
-                log_note(f"File {download_file_name} downloaded")
-            else:
-                log_note(f"File {download_file_name} downloaded and right size: {download_file_name_size}")
-                raise ValueError(f"File not the right size")
-        else:
-            raise FileNotFoundError(f"File download failed")
-        user_sleep()
+        # The browser already wrote the file to a temporary path, hashing it there avoids a second copy
+        log_note('Verify download')
+        download_sha256, download_size = file_sha256(download.path())
+        if expected_sha256 is not None and download_sha256 != expected_sha256:
+            raise ValueError(f"Download {download.suggested_filename} ({download_size} bytes) does not match the uploaded file")
+        log_note(f"File {download.suggested_filename} downloaded: {download_size} bytes, sha256 {download_sha256}", kind='result')
+        download.delete()
+        user_sleep(page=page)
 
         log_note('Download finished')
 
         page.close()
-        log_note("Close download browser")
+        log_note("Close download context")
 
     except Exception as e:
         if hasattr(e, 'message'): # only Playwright error class has this member
-            log_note(f"Exception occurred: {e.message}")
+            log_note(f"Exception occurred: {e.message}", kind='result')
 
         # set a timeout. Since the call to page.content() is blocking we need to defer it to the OS
         signal.signal(signal.SIGALRM, timeout_handler)
@@ -79,27 +94,17 @@ def download(playwright: Playwright, browser_name: str, download_url:str) -> Non
         raise e
 
     # ---------------------
-    context.close()
-    browser.close()
-
-def run(playwright: Playwright, browser_name: str, headless=False) -> None:
-    log_note(f"Launch browser {browser_name}")
-    if browser_name == "firefox":
-        browser = playwright.firefox.launch(headless=False)
+    pool.release(context)
 
-    else:
-        browser = playwright.chromium.launch(headless=False, downloads_path=download_path, args=['--disable-gpu', '--disable-software-rasterizer', '--ozone-platform=wayland'])
-
-    context = browser.new_context(ignore_https_errors=True)
+def run(playwright: Playwright, browser_name: str) -> None:
+    pool = get_pool(playwright, browser_name)
+    context = new_session_context(pool, domain=DOMAIN)
     page = context.new_page()
 
     try:
-        log_note("Opening login page")
-        page.goto(f"{DOMAIN}/login")
-
         log_note("Logging in")
-        login_nextcloud(page, domain=DOMAIN)
-        user_sleep()
+        login_cached(page, domain=DOMAIN)
+        user_sleep(page=page)
 
         # Wait for the modal to load. As it seems you can't close it while it is showing the opening animation.
         log_note("Close first-time run popup")
@@ -107,37 +112,24 @@ def run(playwright: Playwright, browser_name: str, headless=False) -> None:
 
         log_note("Go to Files")
         page.get_by_role("link", name="Files").click()
-        user_sleep()
+        user_sleep(page=page)
 
         log_note("Upload File")
-        page.get_by_role("button", name="New").click()
-        user_sleep()
-
-        div_selector = 'div.v-popper__wrapper:has(ul[role="menu"])'
-        page.wait_for_selector(div_selector, state='visible')
-
         file_name = ''.join(random.choices(string.ascii_letters, k=5)) + '.txt'
 
-        with open(FILE_PATH, 'rb') as f:
-            file_content = f.read()
-
+        payload = Payload(FILE_SIZE, compressibility=FILE_COMPRESSIBILITY, text=True)
         file_payload = {
             'name': file_name,
             'mimeType': 'text/plain',
-            'buffer': file_content,
+            'buffer': payload.bytes(),
         }
-
-        with page.expect_file_chooser() as fc_info:
-            page.locator(f'{div_selector} button:has-text("Upload files")').click()
-
-        file_chooser = fc_info.value
-        file_chooser.set_files(file_payload)
-        user_sleep()
+        open_file_chooser(page).set_files(file_payload)
+        user_sleep(page=page, until=lambda: page.locator(f'tr[data-cy-files-list-row-name="{file_name}"]').wait_for())
 
         log_note('Validate file upload')
         updated_file_locator = page.locator(f'tr[data-cy-files-list-row-name="{file_name}"]')
         expect(updated_file_locator).to_have_count(1)
-        user_sleep()
+        user_sleep(page=page)
 
         # SHARE
         log_note("Get file share link")
@@ -146,32 +138,32 @@ def run(playwright: Playwright, browser_name: str, headless=False) -> None:
 
         toast_selector = 'div.toastify.toast-success:has-text("Link copied")'
         page.wait_for_selector(toast_selector)
-        user_sleep()
+        user_sleep(page=page)
 
         # Does not work with Firefox since clipboard access is blocked for security reasons
         # log_note('Validate share link and go to home')
         # link_url = page.evaluate('navigator.clipboard.readText()')
-        # user_sleep()
+        # user_sleep(page=page)
 
         link_url = page.locator("a.sharing-entry__copy").get_attribute("href")
-        log_note(f"Download link is: {link_url}")
+        log_note(f"Download link is: {link_url}", kind='result')
+        log_note("Go to home")
         page.goto(f"{DOMAIN}")
-        user_sleep()
+        user_sleep(page=page)
 
-        download(playwright, browser_name, link_url)
+        download(pool, link_url, payload.sha256())
 
         log_note('Delete file')
         page.get_by_role("link", name="Files").click()
-        page.locator(f'tr[data-cy-files-list-row-name="{file_name}"] button[aria-label="Actions"]').click()
-        page.locator(f'li[data-cy-files-list-row-action="delete"] button').click()
-        user_sleep()
+        delete_file(page, file_name)
+        user_sleep(page=page)
 
         page.close()
         log_note("Close browser")
 
     except Exception as e:
         if hasattr(e, 'message'): # only Playwright error class has this member
-            log_note(f"Exception occurred: {e.message}")
+            log_note(f"Exception occurred: {e.message}", kind='result')
 
         # set a timeout. Since the call to page.content() is blocking we need to defer it to the OS
         signal.signal(signal.SIGALRM, timeout_handler)
@@ -182,11 +174,87 @@ def run(playwright: Playwright, browser_name: str, headless=False) -> None:
         raise e
 
     # ---------------------
-    context.close()
-    browser.close()
+    pool.release(context)
+
+def upload_sweep(playwright: Playwright, browser_name: str, sizes: list) -> list:
+    pool = get_pool(playwright, browser_name)
+    context = new_session_context(pool, domain=DOMAIN)
+    page = context.new_page()
+    results = []
+
+    # Chunked uploads go through the uploads collection, so those requests show where chunking kicks in
+    chunk_requests = []
+    page.on("request", lambda request: chunk_requests.append(request.method) if '/remote.php/dav/uploads/' in request.url else None)
+
+    try:
+        log_note("Logging in")
+        login_cached(page, domain=DOMAIN)
+        user_sleep(page=page)
+
+        log_note("Close first-time run popup")
+        close_modal(page)
+
+        log_note("Go to Files")
+        page.get_by_role("link", name="Files").click()
+        user_sleep(page=page)
+
+        for size in sizes:
+            label = format_size(size)
+
+            # Generated before the upload phase so writing the file is not part of the measurement
+            log_note(f"Generate {label} file")
+            # The browser uploads under the local name, so a uniquely named hard link of the cached file is uploaded
+            file_name = f"sweep-{label}-{''.join(random.choices(string.ascii_letters, k=5))}.bin"
+            cached_path = payload_file(size, compressibility=FILE_COMPRESSIBILITY)
+            path = os.path.join(os.path.dirname(cached_path), file_name)
+            os.link(cached_path, path)
+            file_chooser = open_file_chooser(page)
+
+            log_note(f"Upload {label} file")
+            chunk_requests.clear()
+            started = time_ns()
+            try:
+                file_chooser.set_files(path)
+                page.locator(f'tr[data-cy-files-list-row-name="{file_name}"]').wait_for(timeout=60_000 + size * 1000 // UPLOAD_MIN_BYTES_PER_SEC)
+            finally:
+                os.remove(path)
+            seconds = (time_ns() - started) / 1e9
+
+            result = {
+                'size': size,
+                'seconds': round(seconds, 3),
+                'mb_per_sec': round(size / 1024 / 1024 / seconds, 2),
+                'chunked': 'MOVE' in chunk_requests,
+                'chunks': chunk_requests.count('PUT'),
+            }
+            results.append(result)
+            log_note(f"Uploaded {label} in {result['seconds']}s ({result['mb_per_sec']} MB/s, {result['chunks']} chunks)", kind='result')
+
+            log_note(f"Delete {label} file")
+            delete_file(page, file_name)
+            user_sleep(page=page)
+
+        page.close()
+        log_note("Close browser")
+
+    except Exception as e:
+        if hasattr(e, 'message'): # only Playwright error class has this member
+            log_note(f"Exception occurred: {e.message}", kind='result')
+        raise e
+
+    pool.release(context)
+
+    # The table goes to the same stdout as the buffered notes and has to come after them
+    events.end_phase()
+    events.flush()
+    print(f"{'size':>8} {'seconds':>9} {'MB/s':>9} {'chunks':>7}")
+    for result in results:
+        print(f"{format_size(result['size']):>8} {result['seconds']:>9} {result['mb_per_sec']:>9} {result['chunks']:>7}")
+    return results
 
 
 if __name__ == "__main__":
+    parse_headless_flag()
     if len(sys.argv) > 1:
         browser_name = sys.argv[1].lower()
         if browser_name not in ["chromium", "firefox"]:
@@ -196,4 +264,11 @@ if __name__ == "__main__":
         browser_name = "firefox"
 
     with sync_playwright() as playwright:
-        run(playwright, browser_name)
+        # With a share link as second argument only the anonymous download is run
+        if len(sys.argv) > 2:
+            download(get_pool(playwright, browser_name), sys.argv[2])
+        elif UPLOAD_SIZES:
+            upload_sweep(playwright, browser_name, UPLOAD_SIZES)
+        else:
+            run(playwright, browser_name)
+        close_pools()
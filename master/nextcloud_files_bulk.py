@@ -0,0 +1,183 @@
+import os
+import random
+import re
+import shutil
+import signal
+import string
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+
+from playwright.sync_api import Playwright, sync_playwright, expect
+
+from helpers.browser_pool import get_pool, close_pools, parse_headless_flag
+from helpers.dav_client import DavClient
+from helpers.event_log import get_labels, events
+from helpers.helper_functions import log_note, close_modal, timeout_handler, user_sleep
+from helpers.session_cache import new_session_context, login_cached
+from helpers.payload import Payload, parse_size
+from helpers import latency
+from nextcloud_files import open_file_chooser
+
+# Uploads many files into a new folder, either all at once through the file chooser of the web UI (BULK_MODE=ui)
+# or with BULK_CONCURRENCY parallel WebDAV PUTs (BULK_MODE=dav). In the UI the uploader decides how many run at once.
+DOMAIN = os.environ.get('HOST_URL', 'http://app')
+DAV_USER = os.environ.get('DAV_USER', 'nextcloud')
+DAV_PASSWORD = os.environ.get('DAV_PASSWORD', 'nextcloud')
+BULK_MODE = os.environ.get('BULK_MODE', 'ui')
+BULK_FILE_COUNT = int(os.environ.get('BULK_FILE_COUNT', 100))
+BULK_FILE_SIZE = parse_size(os.environ.get('BULK_FILE_SIZE', '4K'))
+BULK_CONCURRENCY = int(os.environ.get('BULK_CONCURRENCY', 8))
+BULK_LIST_TIMEOUT_SEC = 600
+BULK_LIST_POLL_SEC = 0.2
+
+def file_names(count: int) -> list:
+    return [f"bulk-{i:05d}.bin" for i in range(count)]
+
+def payload(index: int, size: int) -> Payload:
+    # Every file has its own content, identical files could be deduplicated by storage
+    return Payload(size, seed=f"bulk:{index}")
+
+def wait_for_listing(client: DavClient, folder: str, count: int) -> None:
+    # Depth 1 lists the folder itself plus its content
+    deadline = perf_counter() + BULK_LIST_TIMEOUT_SEC
+    while len(client.propfind(folder, depth=1, properties=('d:getetag',))) - 1 < count:
+        if perf_counter() > deadline:
+            raise TimeoutError(f"{folder} did not list {count} files within {BULK_LIST_TIMEOUT_SEC}s")
+        sleep(BULK_LIST_POLL_SEC)
+
+def upload_dav(client: DavClient, folder: str, count: int, size: int, concurrency: int) -> None:
+    def put(index_and_name):
+        index, name = index_and_name
+        client.request('PUT', client.files_path(f"{folder}/{name}"), payload(index, size).bytes(), expect=(201, 204), name='Bulk file PUT')
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='bulk-upload') as executor:
+        list(executor.map(put, enumerate(file_names(count))))
+
+def upload_ui(playwright: Playwright, browser_name: str, folder: str, count: int, size: int) -> tuple:
+    pool = get_pool(playwright, browser_name)
+    context = new_session_context(pool, domain=DOMAIN)
+    page = context.new_page()
+
+    # Per file latency from the browser's own timing of every upload request
+    scenario = get_labels().get('scenario', latency.SCRIPT_NAME)
+    def record_upload(request):
+        if request.method == 'PUT' and '/remote.php/dav/' in request.url and request.timing['responseEnd'] >= 0:
+            latency.record(scenario, 'Bulk file PUT', int(request.timing['responseEnd'] * 1000))
+    page.on("requestfinished", record_upload)
+
+    directory = os.path.join('/tmp/nextcloud_payloads', folder)
+    try:
+        log_note("Generate bulk files")
+        os.makedirs(directory, exist_ok=True)
+        paths = [payload(index, size).write(os.path.join(directory, name)) for index, name in enumerate(file_names(count))]
+
+        log_note("Logging in")
+        login_cached(page, domain=DOMAIN)
+        user_sleep(page=page)
+
+        log_note("Close first-time run popup")
+        close_modal(page)
+
+        log_note("Go to bulk folder")
+        page.goto(f"{DOMAIN}/index.php/apps/files/files?dir=/{folder}")
+        user_sleep(page=page)
+        file_chooser = open_file_chooser(page)
+
+        log_note(f"Upload {count} files")
+        started = perf_counter()
+        file_chooser.set_files(paths)
+        # The list is virtual and only renders visible rows, the summary in the footer counts all of them
+        expect(page.locator('tr.files-list__row-footer')).to_contain_text(re.compile(rf"\b{count} files?\b"), timeout=BULK_LIST_TIMEOUT_SEC * 1000)
+        finished = perf_counter()
+
+        page.close()
+        log_note("Close browser")
+
+    except Exception as e:
+        if hasattr(e, 'message'): # only Playwright error class has this member
+            log_note(f"Exception occurred: {e.message}", kind='result')
+
+        # set a timeout. Since the call to page.content() is blocking we need to defer it to the OS
+        signal.signal(signal.SIGALRM, timeout_handler)
+        signal.alarm(20)
+        #log_note(f"Page content was: {page.content()}")
+        signal.alarm(0) # remove timeout signal
+
+        raise e
+
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    pool.release(context)
+    return started, finished
+
+def run(playwright, browser_name: str, domain=DOMAIN, mode=BULK_MODE, count=BULK_FILE_COUNT, size=BULK_FILE_SIZE, concurrency=BULK_CONCURRENCY) -> dict:
+    client = DavClient(domain, DAV_USER, DAV_PASSWORD)
+    folder = 'bulk-' + ''.join(random.choices(string.ascii_letters, k=5))
+
+    try:
+        log_note("Create bulk folder")
+        client.mkcol(client.files_path(folder))
+
+        if mode == 'ui':
+            # Up to every row in the list, which is what the user waits for
+            started, uploaded = upload_ui(playwright, browser_name, folder, count, size)
+        else:
+            log_note(f"Upload {count} files")
+            started = perf_counter()
+            upload_dav(client, folder, count, size, concurrency)
+            uploaded = perf_counter()
+
+        log_note("Wait until all files are listed")
+        wait_for_listing(client, folder, count)
+        listed = perf_counter()
+
+        result = {
+            'files': count,
+            'upload_seconds': round(uploaded - started, 3),
+            'listed_seconds': round(listed - started, 3),
+            'files_per_sec': round(count / (uploaded - started), 1),
+        }
+        log_note(f"Uploaded {count} files in {result['upload_seconds']}s ({result['files_per_sec']} files/s), all listed after {result['listed_seconds']}s", kind='result')
+
+        log_note("Delete bulk folder")
+        client.delete(folder)
+
+    except Exception as e:
+        if hasattr(e, 'message'):
+            log_note(f"Exception occurred: {e.message}", kind='result')
+        raise e
+
+    finally:
+        # The last phase ends with the work, not when the interpreter exits
+        events.end_phase()
+        client.pool.close()
+
+    return result
+
+
+if __name__ == "__main__":
+    parse_headless_flag()
+    # With --stub the DAV mode runs against an in memory server instead of HOST_URL
+    if '--stub' in sys.argv:
+        from helpers.dav_stub import start_stub_server
+        server = start_stub_server()
+        run(None, None, domain=server.url, mode='dav')
+        server.shutdown()
+        sys.exit(0)
+
+    if len(sys.argv) > 1:
+        browser_name = sys.argv[1].lower()
+        if browser_name not in ["chromium", "firefox"]:
+            print("Invalid browser name. Please choose either 'chromium' or 'firefox'.")
+            sys.exit(1)
+    else:
+        browser_name = "firefox"
+
+    if BULK_MODE != 'ui':
+        run(None, browser_name)
+    else:
+        with sync_playwright() as playwright:
+            run(playwright, browser_name)
+            close_pools()
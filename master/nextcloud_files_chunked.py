@@ -0,0 +1,82 @@
+import hashlib
+import os
+import random
+import string
+import sys
+
+from helpers.chunked_upload import chunked_upload
+from helpers.dav_client import DavClient
+from helpers.event_log import events
+from helpers.helper_functions import log_note
+from helpers.payload import Payload, parse_size, format_size, payload_file
+
+# Uploads one file with every combination of chunk size and parallel chunk uploads, like the web UI does for large files
+DOMAIN = os.environ.get('HOST_URL', 'http://app')
+DAV_USER = os.environ.get('DAV_USER', 'nextcloud')
+DAV_PASSWORD = os.environ.get('DAV_PASSWORD', 'nextcloud')
+CHUNKED_FILE_SIZE = parse_size(os.environ.get('CHUNKED_FILE_SIZE', '256M'))
+CHUNK_SIZES = [parse_size(size) for size in os.environ.get('CHUNK_SIZES', '5M,10M,50M').split(',')]
+CHUNK_PARALLEL = [int(parallel) for parallel in os.environ.get('CHUNK_PARALLEL', '1,4').split(',')]
+# Downloading the assembled file again proves the chunks were joined in the right order, but doubles the traffic
+CHUNKED_VERIFY = os.environ.get('CHUNKED_VERIFY', '0') == '1'
+
+
+def run(domain=DOMAIN, file_size=CHUNKED_FILE_SIZE, chunk_sizes=CHUNK_SIZES, parallels=CHUNK_PARALLEL) -> list:
+    payload = Payload(file_size)
+    client = DavClient(domain, DAV_USER, DAV_PASSWORD)
+    results = []
+
+    try:
+        # Written once before the first measured upload, the uploads read their chunks from it
+        log_note("Generate payload file")
+        payload_file(file_size)
+
+        for chunk_size in chunk_sizes:
+            for parallel in parallels:
+                file_name = f"chunked-{format_size(file_size)}-{''.join(random.choices(string.ascii_letters, k=5))}.bin"
+
+                log_note(f"Chunked upload of {format_size(file_size)} in {format_size(chunk_size)} chunks, {parallel} parallel")
+                result = chunked_upload(client, file_name, payload, chunk_size, parallel)
+                results.append(result)
+                log_note(f"Uploaded in {result['seconds']}s ({result['mb_per_sec']} MB/s), assembly took {result['assembly_seconds']}s", kind='result')
+
+                log_note("Validate chunked upload")
+                size = client.propfind(file_name).get(client.files_path(file_name), {}).get('getcontentlength')
+                if int(size or -1) != file_size:
+                    raise ValueError(f"{file_name} has size {size} after assembly, expected {file_size}")
+                if CHUNKED_VERIFY:
+                    digest = hashlib.sha256()
+                    client.download(file_name, sink=digest.update)
+                    if digest.hexdigest() != payload.sha256():
+                        raise ValueError(f"{file_name} does not match the uploaded chunks")
+
+                log_note("Delete chunked upload")
+                client.delete(file_name)
+
+    except Exception as e:
+        if hasattr(e, 'message'):
+            log_note(f"Exception occurred: {e.message}", kind='result')
+        raise e
+
+    finally:
+        # The last phase ends with the work, not when the interpreter exits
+        events.end_phase()
+        client.pool.close()
+
+    # The table goes to the same stdout as the buffered notes and has to come after them
+    events.flush()
+    print(f"{'chunk':>8} {'parallel':>8} {'chunks':>7} {'seconds':>9} {'MB/s':>9} {'assembly':>9}")
+    for result in results:
+        print(f"{format_size(result['chunk_size']):>8} {result['parallel']:>8} {result['chunks']:>7} {result['seconds']:>9} {result['mb_per_sec']:>9} {result['assembly_seconds']:>9}")
+    return results
+
+
+if __name__ == "__main__":
+    # With --stub the uploads go to an in memory server instead of HOST_URL
+    if '--stub' in sys.argv:
+        from helpers.dav_stub import start_stub_server
+        server = start_stub_server()
+        run(server.url)
+        server.shutdown()
+    else:
+        run()
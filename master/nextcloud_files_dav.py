@@ -0,0 +1,83 @@
+import hashlib
+import os
+import random
+import string
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from helpers.dav_client import DavClient
+from helpers.event_log import events
+from helpers.helper_functions import log_note
+from helpers.payload import Payload, parse_size
+
+# Same upload -> share -> public download -> delete cycle as nextcloud_files.py, but over WebDAV and OCS without a browser
+DOMAIN = os.environ.get('HOST_URL', 'http://app')
+DAV_USER = os.environ.get('DAV_USER', 'nextcloud')
+DAV_PASSWORD = os.environ.get('DAV_PASSWORD', 'nextcloud')
+DAV_WORKERS = int(os.environ.get('DAV_WORKERS', 4))
+DAV_CYCLES = int(os.environ.get('DAV_CYCLES', 25)) # per worker
+DAV_FILE_SIZE = parse_size(os.environ.get('DAV_FILE_SIZE', '1M'))
+
+
+def cycle(client: DavClient, payload: Payload, file_name: str) -> None:
+    client.upload(file_name, payload.chunks(), payload.size)
+
+    properties = client.propfind(file_name).get(client.files_path(file_name), {})
+    if int(properties.get('getcontentlength') or -1) != payload.size:
+        raise ValueError(f"{file_name} has size {properties.get('getcontentlength')} after upload, expected {payload.size}")
+
+    share_url = client.share_link(file_name)
+
+    digest = hashlib.sha256()
+    client.public_download(share_url, sink=digest.update)
+    if digest.hexdigest() != payload.sha256():
+        raise ValueError(f"Public download of {file_name} does not match the upload")
+
+    client.delete(file_name)
+
+
+def worker(client: DavClient, payload: Payload, worker_id: int, cycles: int) -> None:
+    suffix = ''.join(random.choices(string.ascii_letters, k=5))
+    for i in range(cycles):
+        cycle(client, payload, f"dav-load-{suffix}-{worker_id}-{i}.bin")
+
+
+def run(domain=DOMAIN, workers=DAV_WORKERS, cycles=DAV_CYCLES, file_size=DAV_FILE_SIZE) -> None:
+    payload = Payload(file_size)
+    payload.sha256() # once up front, not in every worker
+    client = DavClient(domain, DAV_USER, DAV_PASSWORD)
+
+    try:
+        log_note(f"Start WebDAV load: {workers} workers, {cycles} cycles each, {file_size} bytes per file")
+        started = perf_counter()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dav-worker') as executor:
+            futures = [executor.submit(worker, client, payload, worker_id, cycles) for worker_id in range(workers)]
+            for future in futures:
+                future.result()
+        seconds = perf_counter() - started
+
+        # Every cycle is five requests: PUT, PROPFIND, share, public GET and DELETE
+        requests = workers * cycles * 5
+        log_note(f"WebDAV load done: {requests} requests in {seconds:.1f}s ({requests / seconds:.1f} requests/s, {client.pool.opened} connections)", kind='result')
+
+    except Exception as e:
+        if hasattr(e, 'message'):
+            log_note(f"Exception occurred: {e.message}", kind='result')
+        raise e
+
+    finally:
+        # The last phase ends with the work, not when the interpreter exits
+        events.end_phase()
+        client.pool.close()
+
+
+if __name__ == "__main__":
+    # With --stub the cycle runs against an in memory server instead of HOST_URL
+    if '--stub' in sys.argv:
+        from helpers.dav_stub import start_stub_server
+        server = start_stub_server()
+        run(server.url)
+        server.shutdown()
+    else:
+        run()
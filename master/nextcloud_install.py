@@ -5,21 +5,19 @@ from time import time_ns
 from dotenv import load_dotenv
 from playwright.sync_api import sync_playwright
 
+from helpers.browser_pool import launch_browser, parse_headless_flag
 from helpers.helper_functions import log_note, timeout_handler, user_sleep
 
 load_dotenv()
 
 DOMAIN = os.environ.get('HOST_URL', 'http://app')
 
-def main(browser_name: str = "firefox", headless=False):
+def main(browser_name: str = "firefox", headless=None):
     with sync_playwright() as playwright:
         log_note(f"Launch browser {browser_name}")
         signal.signal(signal.SIGALRM, timeout_handler)
         signal.alarm(10)
-        if browser_name == "firefox":
-            browser = playwright.firefox.launch(headless=headless)
-        else:
-            browser = playwright.chromium.launch(headless=False, args=['--disable-gpu', '--disable-software-rasterizer', '--ozone-platform=wayland'])
+        browser = launch_browser(playwright, browser_name, headless=headless)
         context = browser.new_context(ignore_https_errors=True)
         page = context.new_page()
         signal.alarm(0) # remove timeout signal
@@ -55,17 +53,18 @@ def main(browser_name: str = "firefox", headless=False):
 
         except Exception as e:
             if hasattr(e, 'message'): # only Playwright error class has this member
-                log_note(f"Exception occurred: {e.message}")
+                log_note(f"Exception occurred: {e.message}", kind='result')
 
             # set a timeout. Since the call to page.content() is blocking we need to defer it to the OS
             signal.signal(signal.SIGALRM, timeout_handler)
             signal.alarm(20)
-            log_note(f"Page content was: {page.content()}")
+            log_note(f"Page content was: {page.content()}", kind='result')
             signal.alarm(0) # remove timeout signal
             raise e
 
 
 if __name__ == '__main__':
+    parse_headless_flag()
     if len(sys.argv) > 1:
         browser_name = sys.argv[1].lower()
         if browser_name not in ["chromium", "firefox"]:
@@ -0,0 +1,86 @@
+import sys
+import signal
+import os
+
+from playwright.sync_api import Playwright, sync_playwright
+
+from helpers.browser_pool import get_pool, close_pools, parse_headless_flag
+from helpers.dav_client import parse_users
+from helpers.helper_functions import log_note, login_nextcloud, timeout_handler, user_sleep
+from helpers.session_cache import new_session_context, login_cached
+
+DOMAIN = os.environ.get('HOST_URL', 'http://app')
+# Users whose sessions the Login step caches, "user:password" separated by commas
+LOGIN_USERS = parse_users(os.environ.get('NC_LOGIN_USERS', 'nextcloud:nextcloud'))
+
+# Always goes through the login form. All other scenarios reuse cached sessions, so this is the only
+# place where login, CSRF token setup and the dashboard redirect end up in the measurement.
+def run(playwright: Playwright, browser_name: str) -> None:
+    pool = get_pool(playwright, browser_name)
+    context = pool.new_context()
+    page = context.new_page()
+
+    try:
+        log_note("Opening login page")
+        page.goto(f"{DOMAIN}/login")
+
+        log_note("Logging in")
+        login_nextcloud(page, domain=DOMAIN)
+        page.wait_for_url(lambda url: '/login' not in url)
+        user_sleep(page=page)
+
+        page.close()
+        log_note("Close browser")
+
+    except Exception as e:
+        if hasattr(e, 'message'): # only Playwright error class has this member
+            log_note(f"Exception occurred: {e.message}", kind='result')
+
+        # set a timeout. Since the call to page.content() is blocking we need to defer it to the OS
+        signal.signal(signal.SIGALRM, timeout_handler)
+        signal.alarm(20)
+        #log_note(f"Page content was: {page.content()}")
+        signal.alarm(0) # remove timeout signal
+
+        raise e
+
+    # ---------------------
+    pool.release(context)
+
+
+# Logs every user in once and caches the session, so later scenarios start logged in and no measured step
+# pays for the login form. A still valid cached session is only checked, not replaced.
+def seed_sessions(playwright: Playwright, browser_name: str, users=LOGIN_USERS) -> None:
+    pool = get_pool(playwright, browser_name)
+    log_note("Seeding login sessions")
+    for username, password in users:
+        context = new_session_context(pool, username, DOMAIN)
+        page = context.new_page()
+        try:
+            login_cached(page, username, password, DOMAIN)
+        except Exception as e:
+            if hasattr(e, 'message'): # only Playwright error class has this member
+                log_note(f"Exception occurred: {e.message}", kind='result')
+            raise e
+        page.close()
+        pool.release(context)
+
+
+if __name__ == "__main__":
+    parse_headless_flag()
+    if len(sys.argv) > 1:
+        browser_name = sys.argv[1].lower()
+        if browser_name not in ["chromium", "firefox"]:
+            print("Invalid browser name. Please choose either 'chromium' or 'firefox'.")
+            sys.exit(1)
+    else:
+        browser_name = "firefox"
+
+    with sync_playwright() as playwright:
+        # --seed [user:password ...] caches sessions instead of measuring the login form
+        if '--seed' in sys.argv:
+            users = sys.argv[sys.argv.index('--seed') + 1:]
+            seed_sessions(playwright, browser_name, parse_users(','.join(users)) if users else LOGIN_USERS)
+        else:
+            run(playwright, browser_name)
+        close_pools()
@@ -0,0 +1,58 @@
+import os
+import sys
+from time import perf_counter
+
+from helpers.event_log import events
+from helpers.helper_functions import log_note
+from helpers.provisioning import admin_client, create_users, delete_users, user_names
+
+# Creates or deletes a population of load test users through the OCS Provisioning API:
+#   python3 nextcloud_provision.py create 1000
+#   python3 nextcloud_provision.py delete 1000
+# Users are named PROVISION_PREFIX plus a number and put into the groups in PROVISION_GROUPS.
+DOMAIN = os.environ.get('HOST_URL', 'http://app')
+PROVISION_PREFIX = os.environ.get('PROVISION_PREFIX', 'loaduser')
+PROVISION_GROUPS = [group for group in os.environ.get('PROVISION_GROUPS', 'loadtest').split(',') if group]
+
+def run(action: str, count: int, domain=DOMAIN) -> None:
+    client = admin_client(domain)
+    usernames = user_names(PROVISION_PREFIX, count)
+
+    try:
+        log_note(f"{action.capitalize()} {count} users")
+        started = perf_counter()
+        if action == 'create':
+            changed = create_users(client, usernames, groups=PROVISION_GROUPS)
+        else:
+            changed = delete_users(client, usernames, groups=PROVISION_GROUPS)
+        seconds = perf_counter() - started
+        log_note(f"{action.capitalize()}d {changed} of {count} users in {seconds:.1f}s ({count / seconds:.1f} users/s)", kind='result')
+
+    except Exception as e:
+        if hasattr(e, 'message'):
+            log_note(f"Exception occurred: {e.message}", kind='result')
+        raise e
+
+    finally:
+        # The last phase ends with the work, not when the interpreter exits
+        events.end_phase()
+        client.pool.close()
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != '--stub']
+    if len(args) < 1 or args[0] not in ['create', 'delete']:
+        print("Usage: nextcloud_provision.py create|delete [count] [--stub]")
+        sys.exit(1)
+    count = int(args[1]) if len(args) > 1 else 100
+
+    # With --stub the users are created in an in memory server and deleted again
+    if '--stub' in sys.argv:
+        from helpers.dav_stub import start_stub_server
+        server = start_stub_server()
+        run('create', count, server.url)
+        run('create', count, server.url)
+        run('delete', count, server.url)
+        server.shutdown()
+    else:
+        run(args[0], count)
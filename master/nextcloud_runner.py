@@ -0,0 +1,100 @@
+import os
+import sys
+
+from playwright.sync_api import sync_playwright
+
+from helpers.browser_pool import get_pool, close_pools, parse_headless_flag
+from helpers.event_log import events, labels
+from helpers.fixtures import HYBRID
+from helpers.helper_functions import log_note
+
+import nextcloud_login
+import nextcloud_calendar
+import nextcloud_contacts
+import nextcloud_docs_create_user
+import nextcloud_docs_create_doc_and_share
+import nextcloud_docs_collaboration
+import nextcloud_files
+import nextcloud_docs_delete_user_and_file
+import nextcloud_talk
+
+# Repeating the flow fills the per phase latency histograms with more than one sample
+ITERATIONS = int(os.environ.get('NC_ITERATIONS', 1))
+
+DOCS_USER = {'username': "docs_dude", 'password': "docsrule!12", 'email': "docs_dude@local.host"}
+
+
+def talk(playwright, browser_name):
+    conversation_link = nextcloud_talk.create_conversation(playwright, browser_name)
+    nextcloud_talk.talk(playwright, conversation_link, browser_name)
+
+# Same order and names as the flow in usage_scenario_master.yml
+STEPS = {
+    'Login': nextcloud_login.seed_sessions,
+    'Calendar': nextcloud_calendar.run,
+    'Contacts': nextcloud_contacts.run,
+    'Create User': lambda playwright, browser_name: nextcloud_docs_create_user.create_user(playwright, browser_name, **DOCS_USER),
+    'Docs create and share': nextcloud_docs_create_doc_and_share.run,
+    'Collaborative Editing': nextcloud_docs_collaboration.collaborate,
+    'Files': nextcloud_files.run,
+    'Delete User': lambda playwright, browser_name: nextcloud_docs_delete_user_and_file.delete_user_and_file(playwright, browser_name, **DOCS_USER),
+    'Talk': talk,
+}
+
+# In hybrid mode users, documents, shares and conversations are fixtures set up through the API,
+# so the steps that only create or delete them in the UI are gone and the rest measure just their interaction
+HYBRID_STEPS = {
+    'Login': nextcloud_login.seed_sessions,
+    'Calendar': nextcloud_calendar.run,
+    'Contacts': nextcloud_contacts.run,
+    'Collaborative Editing': nextcloud_docs_collaboration.collaborate_hybrid,
+    'Files': nextcloud_files.run,
+    'Talk': nextcloud_talk.talk_hybrid,
+}
+
+if HYBRID:
+    STEPS = HYBRID_STEPS
+
+
+def warm_pools(playwright, browser_name: str, steps: list) -> None:
+    get_pool(playwright, browser_name).warm()
+    if 'Collaborative Editing' in steps:
+        get_pool(playwright, browser_name, **nextcloud_docs_collaboration.POOL_OPTIONS).warm()
+    if 'Talk' in steps:
+        nextcloud_talk.participant_pool(playwright, browser_name).warm(nextcloud_talk.participant_browsers())
+
+
+def run(browser_name: str, steps: list) -> None:
+    with sync_playwright() as playwright:
+        # Start every browser the steps use before the first step, so no cold start is part of a measured step
+        warm_pools(playwright, browser_name, steps)
+
+        for iteration in range(ITERATIONS):
+            for step in steps:
+                with labels(scenario=step, iteration=iteration):
+                    log_note(f"Flow step: {step}")
+                    STEPS[step](playwright, browser_name)
+                    log_note(f"Flow step done: {step}")
+
+        # Shutting the browsers down is not part of the last step
+        events.end_phase()
+        close_pools()
+
+
+if __name__ == "__main__":
+    parse_headless_flag()
+    if len(sys.argv) > 1:
+        browser_name = sys.argv[1].lower()
+        if browser_name not in ["chromium", "firefox"]:
+            print("Invalid browser name. Please choose either 'chromium' or 'firefox'.")
+            sys.exit(1)
+    else:
+        browser_name = "firefox"
+
+    steps = sys.argv[2:] or list(STEPS)
+    for step in steps:
+        if step not in STEPS:
+            print(f"Unknown step '{step}'. Please choose from: {', '.join(STEPS)}")
+            sys.exit(1)
+
+    run(browser_name, steps)
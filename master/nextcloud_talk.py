@@ -8,13 +8,26 @@ from time import sleep, time_ns
 
 from playwright.sync_api import Playwright, sync_playwright, expect, TimeoutError
 
-from helpers.helper_functions import log_note, get_random_text, login_nextcloud, close_modal, timeout_handler, user_sleep
+from helpers.browser_pool import get_pool, close_pools, parse_headless_flag
+from helpers.session_cache import new_session_context, login_cached
+from helpers.helper_functions import log_note, get_random_text, close_modal, timeout_handler, user_sleep
+from helpers.fixtures import fixtures, HYBRID
 
 
 DOMAIN = os.environ.get('HOST_URL', 'http://app')
 
 TYPING_DELAY_MS = 200
-TALK_INVITEE_COUNT = 5
+TALK_INVITEE_COUNT = int(os.environ.get('TALK_INVITEE_COUNT', 5))
+# How many guests share one browser process. 1 keeps the old one browser per guest setup,
+# higher values put the guests in isolated contexts of the same browser and need far less memory.
+TALK_CONTEXTS_PER_BROWSER = int(os.environ.get('TALK_CONTEXTS_PER_BROWSER', 1))
+if TALK_CONTEXTS_PER_BROWSER < 1:
+    raise ValueError(f"TALK_CONTEXTS_PER_BROWSER must be at least 1, got {TALK_CONTEXTS_PER_BROWSER}")
+
+# In hybrid mode the conversation is created through the API instead of create_conversation()
+TALK_FIXTURES = {
+    'conversations': [{'name': 'Random talk {suffix}', 'public': True}],
+}
 
 def send_message(sender, message):
     log_note("Sending message")
@@ -24,20 +37,13 @@ def send_message(sender, message):
     #log_note("GMT_SCI_R=1")
 
 def create_conversation(playwright: Playwright, browser_name: str) -> str:
-    log_note(f"Launch browser {browser_name}")
-    if browser_name == "firefox":
-        browser = playwright.firefox.launch(headless=False)
-    else:
-        browser = playwright.chromium.launch(headless=False, args=['--disable-gpu', '--disable-software-rasterizer', '--ozone-platform=wayland'])
-    context = browser.new_context(ignore_https_errors=True)
+    pool = get_pool(playwright, browser_name)
+    context = new_session_context(pool, domain=DOMAIN)
     page = context.new_page()
     try:
-        log_note("Opening login page")
-        page.goto(f"{DOMAIN}/login")
-
         log_note("Logging in")
-        login_nextcloud(page, domain=DOMAIN)
-        user_sleep()
+        login_cached(page, domain=DOMAIN)
+        user_sleep(page=page)
 
         # Wait for the modal to load. As it seems you can't close it while it is showing the opening animation.
         log_note("Close first-time run popup")
@@ -46,7 +52,7 @@ def create_conversation(playwright: Playwright, browser_name: str) -> str:
         log_note("Open Talk app")
         page.locator('#header a[title=Talk]').click()
         page.wait_for_url("**/apps/spreed/")
-        user_sleep()
+        user_sleep(page=page)
 
         log_note("Create conversation")
         #page.click("span.chat-plus-icon")
@@ -55,67 +61,69 @@ def create_conversation(playwright: Playwright, browser_name: str) -> str:
         page.get_by_placeholder("name").fill("Random talk")
         page.get_by_text("Allow guests to join via link").click()
         page.get_by_role("button", name="Create conversation").click()
-        user_sleep()
+        user_sleep(page=page)
 
         log_note('Copy conversation link')
         page.get_by_role("button", name="Copy link").click()
-        user_sleep()
+        user_sleep(page=page)
 
         log_note("Close browser")
 
         # ---------------------
         page.close()
-        context.close()
-        browser.close()
+        pool.release(context)
 
         return page.url
 
     except Exception as e:
         if hasattr(e, 'message'): # only Playwright error class has this member
-            log_note(f"Exception occurred: {e.message}")
+            log_note(f"Exception occurred: {e.message}", kind='result')
 
         # set a timeout. Since the call to page.content() is blocking we need to defer it to the OS
         signal.signal(signal.SIGALRM, timeout_handler)
         signal.alarm(20)
-        log_note(f"Page content was: {page.content()}")
+        log_note(f"Page content was: {page.content()}", kind='result')
         signal.alarm(0) # remove timeout signal
         raise e
 
+def participant_pool(playwright: Playwright, browser_name: str):
+    return get_pool(playwright, browser_name, contexts_per_browser=TALK_CONTEXTS_PER_BROWSER)
+
+def participant_browsers() -> int:
+    return -(-TALK_INVITEE_COUNT // TALK_CONTEXTS_PER_BROWSER)
+
 def talk(playwright: Playwright, url: str, browser_name: str) -> None:
 
     # Launch browsers
-    log_note(f"Launching {TALK_INVITEE_COUNT} {browser_name} browsers")
-    if browser_name == "firefox":
-        browsers = [playwright.firefox.launch(headless=False) for _ in range(TALK_INVITEE_COUNT)]
-    else:
-        browsers = [playwright.chromium.launch(headless=False, args=['--disable-gpu', '--disable-software-rasterizer', '--ozone-platform=wayland']) for _ in range(TALK_INVITEE_COUNT)]
-    contexts = [browser.new_context(ignore_https_errors=True) for browser in browsers]
+    log_note(f"Launching {TALK_INVITEE_COUNT} {browser_name} participants with {TALK_CONTEXTS_PER_BROWSER} per browser")
+    pool = participant_pool(playwright, browser_name)
+    contexts = [pool.new_context() for _ in range(TALK_INVITEE_COUNT)]
     pages = [context.new_page() for context in contexts]
 
     # Go to URL for all users
     log_note("Navigating to Talk conversation with all participants")
     for page in pages:
         page.goto(url)
-    user_sleep()
+    user_sleep(page=pages)
 
     # Perform actions for all users
     log_note("Setting guest usernames for all participants")
     for page in pages:
         page.get_by_placeholder("Guest").fill(f"Person #{pages.index(page) + 1}")
         page.get_by_role("button", name="Submit name and join").click()
-    user_sleep()
+    user_sleep(page=pages)
 
     # Send first message and check for visibility
     log_note("Send the first validation message")
     sender = pages[0]
     message = "Let's send some random text!"
     send_message(sender, message)
-    user_sleep()
+    user_sleep(page=pages)
 
     log_note("Validate the first message got received")
     for page in pages[1:]:
         expect(page.get_by_text(message, exact=True)).to_be_visible()
-    user_sleep()
+    user_sleep(page=pages)
 
     # Send random text and validate it was received by other users
     log_note("Start sending random messages")
@@ -124,13 +132,13 @@ def talk(playwright: Playwright, url: str, browser_name: str) -> None:
         random_text = get_random_text(50)
 
         send_message(sender, random_text)
-        user_sleep()
+        user_sleep(page=pages, until=lambda: sender.get_by_text(random_text, exact=True).wait_for())
 
         log_note('Validating if all users received the message')
         for receiver in receivers:
             expect(receiver.get_by_text(random_text, exact=True)).to_be_visible()
         log_note("Message received by all users")
-        user_sleep()
+        user_sleep(page=pages)
 
     # --------------------
     # Close all users
@@ -139,13 +147,18 @@ def talk(playwright: Playwright, url: str, browser_name: str) -> None:
         page.close()
 
     for context in contexts:
-        context.close()
+        pool.release(context)
+    pool.close()
+
 
-    for browser in browsers:
-        browser.close()
+def talk_hybrid(playwright: Playwright, browser_name: str) -> None:
+    with fixtures(DOMAIN, TALK_FIXTURES) as created:
+        conversation, = created['conversations'].values()
+        talk(playwright, conversation['url'], browser_name)
 
 
-with sync_playwright() as playwright:
+if __name__ == "__main__":
+    parse_headless_flag()
     if len(sys.argv) > 1:
         browser_name = sys.argv[1].lower()
         if browser_name not in ["chromium", "firefox"]:
@@ -154,5 +167,10 @@ with sync_playwright() as playwright:
     else:
         browser_name = "firefox"
 
-    conversation_link = create_conversation(playwright, browser_name)
-    talk(playwright, conversation_link, browser_name)
+    with sync_playwright() as playwright:
+        if HYBRID:
+            talk_hybrid(playwright, browser_name)
+        else:
+            conversation_link = create_conversation(playwright, browser_name)
+            talk(playwright, conversation_link, browser_name)
+        close_pools()
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import sys
+
+from playwright.async_api import async_playwright, expect
+
+from helpers.async_browser_pool import AsyncBrowserPool, open_concurrently
+from helpers.browser_pool import parse_headless_flag
+from helpers.session_cache import new_session_context_async, login_cached_async
+from helpers.helper_functions import log_note, get_random_text, user_sleep_async
+
+DOMAIN = os.environ.get('HOST_URL', 'http://app')
+
+TYPING_DELAY_MS = 200
+TALK_INVITEE_COUNT = int(os.environ.get('TALK_INVITEE_COUNT', 5))
+TALK_CONTEXTS_PER_BROWSER = int(os.environ.get('TALK_CONTEXTS_PER_BROWSER', 1))
+if TALK_CONTEXTS_PER_BROWSER < 1:
+    raise ValueError(f"TALK_CONTEXTS_PER_BROWSER must be at least 1, got {TALK_CONTEXTS_PER_BROWSER}")
+
+# Same flow as nextcloud_talk.py, but all guests join, send and check for messages at the same time
+# instead of one after another.
+
+async def send_message(sender, message):
+    await sender.get_by_role("textbox").click()
+    await sender.keyboard.type(message, delay=TYPING_DELAY_MS)
+    await sender.get_by_role("textbox").press("Enter")
+
+async def create_conversation(pool: AsyncBrowserPool) -> str:
+    context = await new_session_context_async(pool, domain=DOMAIN)
+    page = await context.new_page()
+    try:
+        log_note("Logging in")
+        await login_cached_async(page, domain=DOMAIN)
+        await user_sleep_async(page=page)
+
+        log_note("Open Talk app")
+        await page.locator('#header a[title=Talk]').click()
+        await page.wait_for_url("**/apps/spreed/")
+        await user_sleep_async(page=page)
+
+        log_note("Create conversation")
+        await page.get_by_text("Create a new conversation").click()
+        # Different placeholder names and capitalization on apache vs FPM
+        await page.get_by_placeholder("name").fill("Random talk")
+        await page.get_by_text("Allow guests to join via link").click()
+        await page.get_by_role("button", name="Create conversation").click()
+        await user_sleep_async(page=page)
+
+        log_note('Copy conversation link')
+        await page.get_by_role("button", name="Copy link").click()
+        await user_sleep_async(page=page)
+
+        log_note("Close browser")
+        url = page.url
+        await page.close()
+        await pool.release(context)
+
+        return url
+
+    except Exception as e:
+        if hasattr(e, 'message'): # only Playwright error class has this member
+            log_note(f"Exception occurred: {e.message}", kind='result')
+        raise e
+
+async def join(pool: AsyncBrowserPool, url: str, number: int):
+    context = await pool.new_context()
+    try:
+        page = await context.new_page()
+        await page.goto(url)
+        await page.get_by_placeholder("Guest").fill(f"Person #{number}")
+        await page.get_by_role("button", name="Submit name and join").click()
+    except BaseException:
+        await pool.release(context)
+        raise
+    return context, page
+
+async def expect_everywhere(pages, message):
+    await asyncio.gather(*[expect(page.get_by_text(message, exact=True)).to_be_visible() for page in pages])
+
+async def talk(pool: AsyncBrowserPool, url: str) -> None:
+    log_note(f"Joining {TALK_INVITEE_COUNT} participants to the Talk conversation at once")
+    participants = await open_concurrently(pool, [join(pool, url, i + 1) for i in range(TALK_INVITEE_COUNT)])
+    contexts = [context for context, _ in participants]
+    pages = [page for _, page in participants]
+
+    try:
+        await user_sleep_async(page=pages)
+
+        log_note("Send the first validation message")
+        message = "Let's send some random text!"
+        await send_message(pages[0], message)
+        await user_sleep_async(page=pages)
+
+        log_note("Validate the first message got received")
+        await expect_everywhere(pages[1:], message)
+        await user_sleep_async(page=pages)
+
+        log_note("All participants sending random messages")
+        texts = [get_random_text(50) for _ in pages]
+        await asyncio.gather(*[send_message(page, text) for page, text in zip(pages, texts)])
+        await user_sleep_async(page=pages)
+
+        log_note('Validating if all users received all messages')
+        await asyncio.gather(*[expect_everywhere(pages[:i] + pages[i + 1:], text) for i, text in enumerate(texts)])
+        log_note("Messages received by all users")
+        await user_sleep_async(page=pages)
+
+    except Exception as e:
+        if hasattr(e, 'message'): # only Playwright error class has this member
+            log_note(f"Exception occurred: {e.message}", kind='result')
+        raise e
+
+    finally:
+        # --------------------
+        log_note("Close all browsers")
+        await asyncio.gather(*[pool.release(context) for context in contexts])
+
+async def main(browser_name: str) -> None:
+    async with async_playwright() as playwright:
+        pool = AsyncBrowserPool(playwright, browser_name)
+        participant_pool = AsyncBrowserPool(playwright, browser_name, contexts_per_browser=TALK_CONTEXTS_PER_BROWSER)
+
+        try:
+            conversation_link = await create_conversation(pool)
+            await talk(participant_pool, conversation_link)
+        finally:
+            await participant_pool.close()
+            await pool.close()
+
+
+if __name__ == "__main__":
+    parse_headless_flag()
+    if len(sys.argv) > 1:
+        browser_name = sys.argv[1].lower()
+        if browser_name not in ["chromium", "firefox"]:
+            print("Invalid browser name. Please choose either 'chromium' or 'firefox'.")
+            sys.exit(1)
+    else:
+        browser_name = "firefox"
+
+    asyncio.run(main(browser_name))
@@ -1,170 +1,98 @@
-import contextlib
+import asyncio
 import os
 import sys
-from time import time_ns, sleep
-import signal
 import random
 import string
-from multiprocessing import Pool
 
-from playwright.sync_api import Playwright, sync_playwright, expect
+from playwright.async_api import Playwright, async_playwright
 
-from helpers.helper_functions import log_note, login_nextcloud, close_modal, timeout_handler, user_sleep
+from helpers.async_browser_pool import AsyncBrowserPool
+from helpers.browser_pool import parse_headless_flag
+from helpers.call_participants import CallParticipants, parse_schedule
+from helpers.session_cache import new_session_context_async, login_cached_async
+from helpers.helper_functions import log_note, user_sleep_async
 
 DOMAIN = os.environ.get('HOST_URL', 'http://app:8080')
 
-CHAT_SESSIONS = 2
-CHAT_TIME_SEC = 60
-
-def join(browser_name: str, download_url:str) -> None:
-    with sync_playwright() as playwright:
-        log_note(f"Launching join browser {browser_name}")
-        if browser_name == "firefox":
-            browser = playwright.firefox.launch(headless=False,
-                                                firefox_user_prefs = {
-                                                    "media.navigator.streams.fake": True,
-                                                    "media.navigator.permission.disabled": True
-                                                },
-                                                args=['-width', '1280', '-height', '720']
-                                            )
-        else:
-            browser = playwright.chromium.launch(headless=False, args=['--disable-gpu', '--disable-software-rasterizer', '--ozone-platform=wayland', '--window-size=1280,720'])
-
-        context = browser.new_context(
-            ignore_https_errors=True,
-            viewport={'width': 1280, 'height': 720}
-        )
-        page = context.new_page()
+CHAT_SESSIONS = int(os.environ.get('CHAT_SESSIONS', 2))
+CHAT_TIME_SEC = int(os.environ.get('CHAT_TIME_SEC', 60))
+# Comma separated "<participants>@<seconds>" steps, e.g. "5@30,10@30,20@60,10@30" ramps in and out during the call
+CALL_SCHEDULE = parse_schedule(os.environ.get('CALL_SCHEDULE', f"{CHAT_SESSIONS}@{CHAT_TIME_SEC}"))
+CALL_RAMP_INTERVAL_SEC = float(os.environ.get('CALL_RAMP_INTERVAL_SEC', 0))
+CALL_CONTEXTS_PER_BROWSER = int(os.environ.get('CALL_CONTEXTS_PER_BROWSER', 5))
+if CALL_CONTEXTS_PER_BROWSER < 1:
+    raise ValueError(f"CALL_CONTEXTS_PER_BROWSER must be at least 1, got {CALL_CONTEXTS_PER_BROWSER}")
 
-        try:
-            log_note('Opening call link with participant')
-            page.goto(download_url)
-            user_sleep()
-
-            log_note('Setting name and requesting to join')
-            guest_name = "Guest " + ''.join(random.choices(string.ascii_letters, k=5))
-            page.get_by_placeholder('Guest').fill(guest_name)
-            page.get_by_role('button', name="Submit name and join").click()
-            page.locator('.message-main').get_by_role("button", name="Join call").click()
-            page.locator('.media-settings__call-buttons').get_by_role("button", name="Join call").click()
-            log_note(f"{guest_name} joined the chat")
-            user_sleep()
-
-            log_note(f"Staying the chat and calling for {CHAT_TIME_SEC}s")
-            sleep(CHAT_TIME_SEC)
-
-            log_note('Leaving call with participant')
-            page.get_by_role("button", name="Leave call").click()
-            user_sleep()
-
-            page.close()
-            log_note("Close participant browser")
-
-        except Exception as e:
-            if hasattr(e, 'message'): # only Playwright error class has this member
-                log_note(f"Exception occurred: {e.message}")
-
-            # set a timeout. Since the call to page.content() is blocking we need to defer it to the OS
-            signal.signal(signal.SIGALRM, timeout_handler)
-            signal.alarm(20)
-            #log_note(f"Page content was: {page.content()}")
-            signal.alarm(0) # remove timeout signal
-
-            raise e
-
-        # ---------------------
-        context.close()
-        browser.close()
-
-def run(playwright: Playwright, browser_name: str) -> None:
-    log_note(f"Launch browser {browser_name}")
-    if browser_name == "firefox":
-        browser = playwright.firefox.launch(headless=False,
-                                            firefox_user_prefs = {
-                                                "media.navigator.streams.fake": True,
-                                                "media.navigator.permission.disabled": True
-                                            },
-                                            args=['-width', '1280', '-height', '720']
-                                        )
-    else:
-        browser = playwright.chromium.launch(headless=False, args=['--disable-gpu', '--disable-software-rasterizer', '--ozone-platform=wayland', '--window-size=1280,720'])
+async def run(playwright: Playwright, browser_name: str) -> None:
+    pool = AsyncBrowserPool(playwright, browser_name, window_size=(1280, 720), fake_media=True)
+    participant_pool = AsyncBrowserPool(playwright, browser_name, contexts_per_browser=CALL_CONTEXTS_PER_BROWSER, window_size=(1280, 720), fake_media=True)
 
-    context = browser.new_context(
-        ignore_https_errors=True,
-        viewport={'width': 1280, 'height': 720}
-    )
-    page = context.new_page()
+    context = await new_session_context_async(pool, domain=DOMAIN, viewport={'width': 1280, 'height': 720})
+    page = await context.new_page()
 
     try:
-        log_note("Opening login page")
-        page.goto(f"{DOMAIN}/login")
-
         log_note("Logging in")
-        login_nextcloud(page, domain=DOMAIN)
-        user_sleep()
-
-        # Wait for the modal to load. As it seems you can't close it while it is showing the opening animation.
-        log_note("Close first-time run popup")
-        close_modal(page)
+        await login_cached_async(page, domain=DOMAIN)
+        await user_sleep_async(page=page)
 
         log_note("Go to Talk app")
-        page.locator('#header a[title=Talk]').click()
-        page.wait_for_url("**/apps/spreed/")
-        user_sleep()
+        await page.locator('#header a[title=Talk]').click()
+        await page.wait_for_url("**/apps/spreed/")
+        await user_sleep_async(page=page)
 
         log_note("Start new chat session")
-        #page.locator('button.action-item__menutoggle:has(.chat-plus-icon)').click()
-        page.get_by_text("Create a new conversation").click()
+        await page.get_by_text("Create a new conversation").click()
         chat_name = "Chat " + ''.join(random.choices(string.ascii_letters, k=5))
-        page.get_by_placeholder('Enter a name for this conversation').fill(chat_name)
-        page.locator(f'text="Allow guests to join via link"').click()
-        page.get_by_role("button", name="Create conversation").click()
-        user_sleep()
+        await page.get_by_placeholder('Enter a name for this conversation').fill(chat_name)
+        await page.locator(f'text="Allow guests to join via link"').click()
+        await page.get_by_role("button", name="Create conversation").click()
+        await user_sleep_async(page=page)
 
         log_note('Copying conversation link')
-        page.get_by_role("button", name="Copy link").click()
+        await page.get_by_role("button", name="Copy link").click()
 
-        page.locator('.modal-container').get_by_role('button', name="Close").click()
+        await page.locator('.modal-container').get_by_role('button', name="Close").click()
         link_url = page.url# evaluate('navigator.clipboard.readText()')
-        log_note(f"Chat url is: {link_url}")
-        user_sleep()
+        log_note(f"Chat url is: {link_url}", kind='result')
+        await user_sleep_async(page=page)
 
         log_note('Starting the call')
-        page.get_by_role("button", name="Start call").click()
-        #page.locator('.media-settings__call-buttons').get_by_role("button", name="Start call").click()
-        user_sleep()
+        await page.get_by_role("button", name="Start call").click()
+        await user_sleep_async(page=page)
 
-        log_note(f"Starting {CHAT_SESSIONS} Chat clients")
-        args = [(browser_name, link_url) for _ in range(CHAT_SESSIONS)]
-        with Pool(processes=CHAT_SESSIONS) as pool:
-            pool.starmap(join, args)
+        participants = CallParticipants(participant_pool, link_url, CALL_RAMP_INTERVAL_SEC)
+        try:
+            await participants.run_schedule(CALL_SCHEDULE)
+        finally:
+            log_note('Leaving call with all participants')
+            await participants.leave_all()
 
         log_note('Leaving the call with the host')
-        page.get_by_role("button", name="Leave call").click()
-        page.get_by_role('menuitem', name='Leave call').click()
-        user_sleep()
+        await page.get_by_role("button", name="Leave call").click()
+        await page.get_by_role('menuitem', name='Leave call').click()
+        await user_sleep_async(page=page)
 
-        page.close()
+        await page.close()
         log_note("Close browser")
 
     except Exception as e:
         if hasattr(e, 'message'): # only Playwright error class has this member
-            log_note(f"Exception occurred: {e.message}")
-
-        # set a timeout. Since the call to page.content() is blocking we need to defer it to the OS
-        signal.signal(signal.SIGALRM, timeout_handler)
-        signal.alarm(20)
-        #log_note(f"Page content was: {page.content()}")
-        signal.alarm(0) # remove timeout signal
-
+            log_note(f"Exception occurred: {e.message}", kind='result')
         raise e
 
-    # ---------------------
-    context.close()
-    browser.close()
+    finally:
+        # ---------------------
+        await pool.release(context)
+        await participant_pool.close()
+        await pool.close()
+
+async def main(browser_name: str) -> None:
+    async with async_playwright() as playwright:
+        await run(playwright, browser_name)
 
 
 if __name__ == "__main__":
+    parse_headless_flag()
     if len(sys.argv) > 1:
         browser_name = sys.argv[1].lower()
         if browser_name not in ["chromium", "firefox"]:
@@ -173,5 +101,4 @@ if __name__ == "__main__":
     else:
         browser_name = "firefox"
 
-    with sync_playwright() as playwright:
-        run(playwright, browser_name)
+    asyncio.run(main(browser_name))